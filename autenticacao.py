@@ -0,0 +1,169 @@
+"""
+Autenticação do ECU Manager: senhas com scrypt (sal por usuário) e sessões com token assinado
+Hashes SHA-256 antigos são trocados por scrypt no próximo login. O token de sessão é validado
+pelo main.py com um HMAC e uma leitura pela chave primária (sem refazer o login).
+
+Uso:
+    python autenticacao.py --calibrar 100     # maior custo de scrypt que cabe em ~100 ms nesta máquina
+"""
+
+import argparse, base64, hashlib, hmac, os, secrets, time
+import db
+
+DB_USERS = "usuarios.db" # Caminho do banco de usuários
+
+# Custo do scrypt: memória = 128 * n * r bytes (16 MB no padrão). Ajustável por variável de ambiente;
+# hashes gravados com outro custo são refeitos no próximo login.
+SCRYPT_N = int(os.environ.get("ECU_SCRYPT_N", 2**14))
+SCRYPT_R = int(os.environ.get("ECU_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("ECU_SCRYPT_P", 1))
+SAL_BYTES = 16
+HASH_BYTES = 32
+SESSAO_HORAS = float(os.environ.get("ECU_SESSAO_HORAS", 12)) # Validade do token de sessão
+
+# ------------------ BANCO ------------------
+def _criar_schema(conn): # Executado uma única vez por processo (ver db.get_connection)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            endereco TEXT,
+            usuario TEXT UNIQUE NOT NULL,
+            senha_hash TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            criada REAL NOT NULL,
+            expira REAL NOT NULL,
+            revogada INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS sessoes_expira ON sessoes(expira)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chave_sessao (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            chave BLOB NOT NULL
+        )
+    """) # Segredo do HMAC dos tokens, gerado na criação do banco
+    conn.execute("INSERT OR IGNORE INTO chave_sessao (id, chave) VALUES (1, ?)", (secrets.token_bytes(32),))
+
+def conectar(): # Conexão compartilhada com o banco de usuários (não fechar)
+    return db.get_connection(DB_USERS, _criar_schema)
+
+# ------------------ SENHAS ------------------
+def _scrypt(senha, sal, n, r, p):
+    return hashlib.scrypt(senha.encode("utf-8"), salt=sal, n=n, r=r, p=p, dklen=HASH_BYTES,
+                          maxmem=256 * n * r + 2**20) # O limite padrão do OpenSSL (32 MB) barra custos maiores
+
+def _b64(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+def _unb64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+def gerar_hash(senha, n=None, r=None, p=None): # "scrypt$n$r$p$sal$hash" com os custos atuais
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    sal = secrets.token_bytes(SAL_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(sal)}${_b64(_scrypt(senha, sal, n, r, p))}"
+
+def verificar_senha(senha, armazenado): # (confere, precisa_refazer_o_hash)
+    if armazenado.startswith("scrypt$"):
+        try:
+            _, n, r, p, sal, esperado = armazenado.split("$")
+            n, r, p = int(n), int(r), int(p)
+            confere = hmac.compare_digest(_scrypt(senha, _unb64(sal), n, r, p), _unb64(esperado))
+        except (ValueError, TypeError, OverflowError): # Hash corrompido (campos, base64 ou custos inválidos): não confere
+            return False, False
+        return confere, confere and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    # Formato antigo: SHA-256 sem sal, em hexadecimal (comparado em bytes: compare_digest recusa str não ASCII)
+    confere = hmac.compare_digest(hashlib.sha256(senha.encode("utf-8")).hexdigest().encode(), armazenado.encode("utf-8"))
+    return confere, confere
+
+_hash_ficticio = None # Usuário inexistente também paga um scrypt (não revela quem existe pelo tempo)
+
+def autenticar(usuario, senha): # (id, nome) se usuário e senha conferem; senão None
+    global _hash_ficticio
+    conn = conectar()
+    row = conn.execute("SELECT id, nome, senha_hash FROM usuarios WHERE usuario=?", (usuario,)).fetchone()
+    if row is None:
+        if _hash_ficticio is None:
+            _hash_ficticio = gerar_hash(secrets.token_hex(8))
+        verificar_senha(senha, _hash_ficticio)
+        return None
+    usuario_id, nome, armazenado = row
+    confere, refazer = verificar_senha(senha, armazenado)
+    if not confere:
+        return None
+    if refazer: # SHA-256 antigo ou custo desatualizado: grava o hash novo
+        with conn:
+            conn.execute("UPDATE usuarios SET senha_hash=? WHERE id=? AND senha_hash=?",
+                         (gerar_hash(senha), usuario_id, armazenado))
+    return usuario_id, nome
+
+def calibrar(alvo_ms, r=None, p=None): # Maior n (potência de 2) cujo hash leva até alvo_ms
+    n, melhor = 2**10, 2**10
+    while n <= 2**22:
+        inicio = time.perf_counter()
+        _scrypt("calibragem", b"\0" * SAL_BYTES, n, r or SCRYPT_R, p or SCRYPT_P)
+        if (time.perf_counter() - inicio) * 1000 > alvo_ms:
+            break
+        melhor, n = n, n * 2
+    return melhor
+
+# ------------------ SESSÕES ------------------
+_chaves = {} # Caminho do banco -> segredo do HMAC (lido uma vez por processo)
+
+def _chave():
+    chave = _chaves.get(DB_USERS)
+    if chave is None:
+        chave = _chaves[DB_USERS] = conectar().execute("SELECT chave FROM chave_sessao WHERE id=1").fetchone()[0]
+    return chave
+
+def _assinar(carga):
+    return _b64(hmac.new(_chave(), carga.encode("ascii"), hashlib.sha256).digest())
+
+def criar_sessao(usuario_id, horas=None): # Grava a sessão e devolve o token "id.expira.assinatura"
+    agora = time.time()
+    expira = int(agora + (SESSAO_HORAS if horas is None else horas) * 3600)
+    conn = conectar()
+    with conn:
+        conn.execute("DELETE FROM sessoes WHERE expira < ?", (agora,)) # Faxina das vencidas (pelo índice)
+        sessao_id = conn.execute("INSERT INTO sessoes (usuario_id, criada, expira) VALUES (?, ?, ?)",
+                                 (usuario_id, agora, expira)).lastrowid
+    carga = f"{sessao_id}.{expira}"
+    return f"{carga}.{_assinar(carga)}"
+
+def verificar_sessao(token): # Nome do usuário se o token é válido; senão None
+    # Assinatura e validade sem tocar no banco; depois uma leitura pela chave primária (revogação)
+    try:
+        sessao_id, expira, assinatura = token.split(".")
+        sessao_id, expira = int(sessao_id), int(expira)
+    except ValueError:
+        return None
+    # Em bytes: compare_digest recusa str fora do ASCII (token vindo da linha de comando)
+    esperado = _assinar(f"{sessao_id}.{expira}").encode("ascii")
+    if not hmac.compare_digest(esperado, assinatura.encode("utf-8", "replace")) or expira < time.time():
+        return None
+    row = conectar().execute("SELECT u.nome FROM sessoes s JOIN usuarios u ON u.id = s.usuario_id "
+                             "WHERE s.id=? AND s.revogada=0", (sessao_id,)).fetchone()
+    return row[0] if row else None
+
+def encerrar_sessao(token): # Revoga o token (logout)
+    try:
+        sessao_id = int(token.split(".", 1)[0])
+    except ValueError:
+        return
+    conn = conectar()
+    with conn:
+        conn.execute("UPDATE sessoes SET revogada=1 WHERE id=?", (sessao_id,))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste do custo do scrypt.")
+    parser.add_argument("--calibrar", type=float, metavar="MS", required=True, help="Tempo alvo de um login em ms")
+    args = parser.parse_args()
+    n = calibrar(args.calibrar)
+    print(f"ECU_SCRYPT_N={n} (r={SCRYPT_R}, p={SCRYPT_P}, {128 * n * SCRYPT_R / 2**20:.0f} MB por login)")
@@ -0,0 +1,244 @@
+"""
+Benchmark da camada de dados do ECU Manager (sem interface gráfica)
+Gera catálogos sintéticos, mede importação, buscas, edição/exclusão, exportação e limpeza,
+além do login (scrypt e sessões), e grava o resultado em JSON para comparar entre commits.
+
+Uso:
+    python benchmark.py --tamanhos 10000,100000 -o bench.json
+    python benchmark.py --tamanhos 10000 --comparar bench_anterior.json
+"""
+
+import argparse, csv, json, os, platform, random, shutil, sqlite3, statistics, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+import db, main, limpeza, autenticacao, snapshot
+
+TAMANHOS = (10_000, 100_000, 1_000_000)
+REPETICOES = 30 # Execuções por forma de busca
+ESCRITAS = 200 # Updates e deletes medidos por tamanho
+LOGINS = 20 # Logins medidos (cada um custa um scrypt)
+LOGIN_THREADS = 4 # Logins simultâneos na medida de vazão
+
+# Famílias reais de ECUs Bosch, usadas para gerar modelos plausíveis
+FAMILIAS = ("MED17.{}.{}", "EDC17C{}{}", "EDC16C{}{}", "ME7.{}.{}", "M7.9.{}{}", "MEVD17.{}.{}", "ME17.{}.{}", "EDC15C{}{}")
+PREFIXOS = ("0261", "0281", "0265", "1037", "1039", "0986")
+FABRICANTES = ("VOLKSWAGEN", "AUDI", "FIAT", "CHEVROLET", "FORD", "RENAULT", "PEUGEOT", "CITROEN",
+               "MERCEDES", "BMW", "TOYOTA", "HYUNDAI", "KIA", "NISSAN", "HONDA", "JEEP", "VOLVO", "IVECO")
+
+# ---------------- CATÁLOGO ----------------
+def gerar_catalogo(n, semente=42): # (linha, num_bosch, modelo_ecu, fabricante) únicos e reprodutíveis
+    rnd = random.Random(semente)
+    for i in range(n):
+        prefixo = PREFIXOS[i % len(PREFIXOS)]
+        num = f"{prefixo}{i:06d}" # Único por construção
+        modelo = rnd.choice(FAMILIAS).format(rnd.randint(1, 9), rnd.randint(0, 20))
+        yield i + 2, num, modelo, rnd.choice(FABRICANTES)
+
+def gravar_csv(caminho, n):
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(limpeza.COLUNAS)
+        writer.writerows(r[1:] for r in gerar_catalogo(n))
+
+# ---------------- MEDIÇÃO ----------------
+def cronometrar(fn, repeticoes=1, antes=None): # Latências em ms: média, p50, p95 e máximo
+    tempos = []
+    for _ in range(repeticoes):
+        if antes: # Preparação fora do tempo medido
+            antes()
+        inicio = time.perf_counter()
+        fn()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        "n": repeticoes,
+        "media_ms": round(statistics.fmean(tempos), 3),
+        "p50_ms": round(tempos[len(tempos) // 2], 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        "max_ms": round(tempos[-1], 3),
+    }
+
+def buscas(): # Formas de busca medidas: nome -> argumentos de search_ecus
+    return {
+        "vazia": ("", "", ""),
+        "prefixo_curto": ("0281", "", ""),
+        "prefixo_longo": ("02810000", "", ""),
+        "curinga_num": ("*0001*", "", ""),
+        "substring_modelo": ("", "17.5", ""),
+        "substring_fabricante": ("", "", "VOLKS"),
+        "termo_curto": ("", "M7", ""),
+        "multi_campo": ("0261", "MED17", "AUDI"),
+    }
+
+def medir_buscas(caminho_db, repeticoes, usar_snapshot): # Formas de busca num backend: SQLite ou snapshot
+    main.USE_SNAPSHOT = usar_snapshot
+    antes = None
+    if usar_snapshot: # Snapshot em dia antes de medir; sem ele as buscas cairiam no SQLite
+        snapshot.gerar(caminho_db, main.get_connection())
+        if snapshot.consultar(caminho_db, main.get_connection(), "count") is None:
+            raise RuntimeError("snapshot desatualizado logo após ser gerado")
+        antes = lambda: snapshot.esquecer_filtros(caminho_db) # Cada repetição filtra de novo (sem o cache de posições)
+    resultado = {}
+    try:
+        for nome, termos in buscas().items():
+            linhas = len(main.search_ecus(*termos))
+            medida = cronometrar(lambda: main.search_ecus(*termos), repeticoes, antes)
+            medida["linhas"] = linhas
+            medida["grid_ms"] = cronometrar( # O que o grid realmente faz: COUNT + 1ª página
+                lambda: (main.count_ecus(*termos), main.page_ecus(*termos)), repeticoes, antes)["p50_ms"]
+            resultado[nome] = medida
+    finally:
+        main.USE_SNAPSHOT = False
+        snapshot.fechar(caminho_db)
+    return resultado
+
+def medir_tamanho(n, pasta, repeticoes): # Todas as medições para um catálogo com n linhas
+    caminho_db = os.path.join(pasta, f"bench_{n}.db")
+    caminho_csv = os.path.join(pasta, f"bench_{n}.csv")
+    gravar_csv(caminho_csv, n)
+    main.DB_FILE = caminho_db
+    main.USE_SNAPSHOT = False # Só as buscas medem o snapshot (escritas não disparam reconstruções ao fundo)
+    main.init_db()
+    resultado = {"linhas": n}
+
+    inicio = time.perf_counter()
+    report = main.import_csv_bulk(caminho_csv)
+    segundos = time.perf_counter() - inicio
+    resultado["importacao"] = {"segundos": round(segundos, 3), "linhas_s": round(report.imported / segundos),
+                               "importados": report.imported}
+    inicio = time.perf_counter()
+    report = main.import_csv_bulk(caminho_csv) # Reimportação: tudo duplicado
+    resultado["reimportacao"] = {"segundos": round(time.perf_counter() - inicio, 3),
+                                 "duplicados": len(report.duplicates)}
+
+    resultado["busca"] = {"sqlite": medir_buscas(caminho_db, repeticoes, False),
+                          "snapshot": medir_buscas(caminho_db, repeticoes, True)}
+
+    rnd = random.Random(7)
+    ids = [r[0] for r in main.get_connection().execute(
+        f"SELECT id FROM {main.TABLE_NAME} ORDER BY random() LIMIT ?", (ESCRITAS * 2,))]
+    alvo_update, alvo_delete = ids[:ESCRITAS], ids[ESCRITAS:]
+    fila = iter(alvo_update)
+    resultado["update"] = cronometrar(
+        lambda: main.update_ecu(next(fila), f"X{rnd.randint(0, 10**9):010d}", "MED17.9.9", "BENCH"), len(alvo_update))
+    fila_delete = iter(alvo_delete)
+    resultado["delete"] = cronometrar(lambda: main.delete_ecu(next(fila_delete)), len(alvo_delete))
+    fila_insert = iter(range(ESCRITAS))
+    resultado["insert"] = cronometrar(
+        lambda: main.insert_ecu(f"Z{next(fila_insert):09d}", "EDC17C64", "BENCH"), ESCRITAS)
+
+    resultado["estatisticas"] = cronometrar(main.ecu_stats, repeticoes) # Painel: lê a tabela de resumo
+    resultado["estatisticas"]["group_by_ms"] = cronometrar( # O que o painel faria sem o resumo
+        lambda: main.get_connection().execute(f"SELECT fabricante, COUNT(*) FROM {main.TABLE_NAME} "
+                                              f"GROUP BY fabricante").fetchall(), repeticoes)["p50_ms"]
+
+    for fmt, ext in (("csv", ".csv"), ("csv.gz", ".csv.gz")):
+        report = main.export_ecus(os.path.join(pasta, f"export_{n}{ext}"), fmt=fmt)
+        resultado[f"exportacao_{fmt}"] = {"segundos": round(report.seconds, 3), "linhas_s": round(report.rate)}
+
+    stats = limpeza.Estatisticas()
+    inicio = time.perf_counter()
+    total = sum(1 for _ in limpeza.limpar(caminho_csv, stats))
+    resultado["limpeza"] = {"segundos": round(time.perf_counter() - inicio, 3), "linhas": total,
+                            "etapas_ms": {nome: round(s * 1000, 1) for nome, s, _ in stats.tempos}}
+    resultado["tamanho_db_mb"] = round(os.path.getsize(caminho_db) / 2**20, 2)
+    db.close_thread_connections()
+    return resultado
+
+def medir_login(pasta, repeticoes): # Latência e vazão do login, migração do SHA-256 e validação de sessão
+    autenticacao.DB_USERS = os.path.join(pasta, "bench_usuarios.db")
+    conn = autenticacao.conectar()
+    usuarios = [f"user{i}" for i in range(LOGINS + LOGIN_THREADS * LOGINS)]
+    with conn:
+        conn.executemany("INSERT INTO usuarios (nome, email, usuario, senha_hash) VALUES (?, ?, ?, ?)",
+                         ((u, f"{u}@bench", u, autenticacao.hashlib.sha256(u.encode()).hexdigest())
+                          for u in usuarios)) # Senha = usuário, no formato antigo
+    legados = iter(usuarios[:LOGINS])
+    resultado = {"scrypt": {"n": autenticacao.SCRYPT_N, "r": autenticacao.SCRYPT_R, "p": autenticacao.SCRYPT_P}}
+    # 1º login de cada usuário: confere o SHA-256 e grava o scrypt
+    resultado["login_legado"] = cronometrar(lambda: autenticacao.autenticar(*[next(legados)] * 2), LOGINS)
+    resultado["login"] = cronometrar(lambda: autenticacao.autenticar("user0", "user0"), LOGINS)
+    resultado["login_senha_errada"] = cronometrar(lambda: autenticacao.autenticar("user0", "x"), LOGINS)
+    resultado["login_usuario_inexistente"] = cronometrar(lambda: autenticacao.autenticar("ninguem", "x"), LOGINS)
+
+    for u in usuarios[LOGINS:]: # Já migrados, para a vazão medir só o scrypt
+        autenticacao.autenticar(u, u)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(LOGIN_THREADS) as pool: # hashlib.scrypt libera o GIL
+        ok = sum(r is not None for r in pool.map(lambda u: autenticacao.autenticar(u, u), usuarios[LOGINS:]))
+    segundos = time.perf_counter() - inicio
+    resultado["vazao"] = {"threads": LOGIN_THREADS, "logins": ok, "logins_s": round(ok / segundos, 1)}
+
+    token = autenticacao.criar_sessao(1)
+    resultado["criar_sessao"] = cronometrar(lambda: autenticacao.criar_sessao(1), repeticoes)
+    resultado["verificar_sessao"] = cronometrar(lambda: autenticacao.verificar_sessao(token), repeticoes * 10)
+    db.close_thread_connections()
+    return resultado
+
+# ---------------- RELATÓRIO ----------------
+def metadados():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "data": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "sistema": platform.platform()}
+
+def _achatar(dados, prefixo=""): # {"a": {"b": 1}} -> {"a.b": 1} (só números)
+    plano = {}
+    for chave, valor in dados.items():
+        if isinstance(valor, dict):
+            plano.update(_achatar(valor, f"{prefixo}{chave}."))
+        elif isinstance(valor, (int, float)):
+            plano[prefixo + chave] = valor
+    return plano
+
+def comparar(atual, anterior): # Diferença percentual das métricas de tempo em comum
+    print(f"\n📊 Comparação com {anterior['meta'].get('commit')} ({anterior['meta'].get('data')}):")
+    grupos = list(atual["resultados"].items()) + [("login", atual.get("login", {}))]
+    for tamanho, dados in grupos:
+        antes = _achatar(anterior.get("login", {}) if tamanho == "login" else anterior["resultados"].get(tamanho, {}))
+        for chave, valor in _achatar(dados).items():
+            if not (chave.endswith("_ms") or chave.endswith("segundos")) or not antes.get(chave):
+                continue
+            delta = (valor - antes[chave]) / antes[chave] * 100
+            marca = "🔴" if delta > 20 else "🟢" if delta < -20 else "  "
+            print(f" {marca} {tamanho:>8} {chave:<42} {antes[chave]:>10} -> {valor:>10} ({delta:+.0f}%)")
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da camada de dados do ECU Manager.")
+    parser.add_argument("--tamanhos", default=",".join(map(str, TAMANHOS)), help="Ex.: 10000,100000,1000000")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("-o", "--saida", default="benchmark.json")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--manter", action="store_true", help="Não apaga os bancos/CSVs gerados")
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix="ecu_bench_")
+    relatorio = {"meta": metadados(), "resultados": {}}
+    try:
+        for n in (int(t) for t in args.tamanhos.split(",")):
+            print(f"⏱️  {n} linhas...", flush=True)
+            relatorio["resultados"][str(n)] = medir_tamanho(n, pasta, args.repeticoes)
+            r = relatorio["resultados"][str(n)]
+            print(f"   importação {r['importacao']['linhas_s']} linhas/s · "
+                  f"busca prefixo p50 {r['busca']['sqlite']['prefixo_curto']['p50_ms']} ms (SQLite) / "
+                  f"{r['busca']['snapshot']['prefixo_curto']['p50_ms']} ms (snapshot) · "
+                  f"update p50 {r['update']['p50_ms']} ms")
+        print("⏱️  login...", flush=True)
+        r = relatorio["login"] = medir_login(pasta, args.repeticoes)
+        print(f"   login p50 {r['login']['p50_ms']} ms · {r['vazao']['logins_s']} logins/s · "
+              f"sessão p50 {r['verificar_sessao']['p50_ms']} ms")
+    finally:
+        if not args.manter:
+            shutil.rmtree(pasta, ignore_errors=True)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"✅ Resultado salvo em {args.saida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(relatorio, json.load(f))
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,313 @@
+"""
+Motor de busca do catálogo de ECUs
+Número Bosch: exato/prefixo pela chave normalizada (num_norm, índice B-tree); parecidos pelos
+trigramas da chave. Modelo e fabricante: substring pelo FTS5 (trigram).
+"""
+
+import sqlite3, fnmatch, threading, re
+from collections import OrderedDict
+
+TABLE_NAME = "modelos_ecu" # Tabela principal
+FTS_TABLE = "modelos_ecu_fts" # Índice de texto (conteúdo externo: não duplica os dados)
+NUM_FTS_TABLE = "modelos_ecu_num_fts" # Trigramas de num_norm: candidatos para números parecidos
+FTS_CONTROL = "modelos_ecu_fts_ctl" # Uma linha: bulk=1 desliga o gatilho de INSERT durante importações
+TRIGRAM_MIN = 3 # O tokenizer trigram só casa termos com 3+ caracteres
+WILDCARDS = ("*", "%", "_") # Curingas que forçam LIKE no número Bosch
+
+SIMILAR_CANDIDATES = 200 # Candidatos lidos do índice de trigramas antes de ordenar pela distância
+SIMILAR_MAX_DISTANCE = 3 # Edições (troca, inclusão, exclusão, inversão) aceitas num número "parecido"
+
+CACHE_SIZE = 128 # Filtros recentes guardados (1ª página + total de cada um)
+VERSION_TABLE = "modelos_ecu_versao" # Contador persistente de mudanças (gatilhos em snapshot.create_schema)
+
+fts_enabled = False # Vira True quando o SQLite suporta FTS5 + trigram (ver create_search_schema)
+
+# ---------------- CHAVE NORMALIZADA ----------------
+_NOT_ALNUM = re.compile(r"[\W_]+")
+
+def normalize_num(num_bosch): # "0 281.012-345" -> "281012345": sem pontuação/espaços, maiúsculo, sem zeros à esquerda
+    return _NOT_ALNUM.sub("", num_bosch or "").upper().lstrip("0")
+
+def edit_distance(a, b, limit=None): # Levenshtein com inversão de vizinhos (dígitos trocados ao digitar)
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if limit is not None and min(current) > limit: # Nenhum caminho volta para dentro do limite
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+# ---------------- SCHEMA ----------------
+def create_search_schema(conn): # Cria o índice FTS e os gatilhos que o mantêm sincronizado
+    global fts_enabled
+    # O índice UNIQUE(num_bosch, modelo_ecu) já é um B-tree com num_bosch na frente:
+    # atende exato e prefixo sem um índice extra.
+    existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (FTS_TABLE,)).fetchone()
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                modelo_ecu, fabricante,
+                content='{TABLE_NAME}', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError: # SQLite sem FTS5/trigram: fica só o LIKE
+        fts_enabled = False
+        return
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {FTS_CONTROL} (bulk INTEGER NOT NULL)")
+    if not conn.execute(f"SELECT 1 FROM {FTS_CONTROL}").fetchone():
+        conn.execute(f"INSERT INTO {FTS_CONTROL} (bulk) VALUES (0)")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE_NAME}
+        WHEN (SELECT bulk FROM {FTS_CONTROL}) = 0 BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, modelo_ecu, fabricante) VALUES (new.id, new.modelo_ecu, new.fabricante);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE_NAME} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, modelo_ecu, fabricante)
+            VALUES ('delete', old.id, old.modelo_ecu, old.fabricante);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {TABLE_NAME} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, modelo_ecu, fabricante)
+            VALUES ('delete', old.id, old.modelo_ecu, old.fabricante);
+            INSERT INTO {FTS_TABLE}(rowid, modelo_ecu, fabricante) VALUES (new.id, new.modelo_ecu, new.fabricante);
+        END
+    """)
+    if not existed: # Banco antigo: indexa as linhas que já existem
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _create_num_index(conn)
+    fts_enabled = True
+
+def _create_num_index(conn): # Trigramas de num_norm (mesmo esquema de gatilhos do índice de texto)
+    existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (NUM_FTS_TABLE,)).fetchone()
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {NUM_FTS_TABLE} USING fts5(
+            num_norm, content='{TABLE_NAME}', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {NUM_FTS_TABLE}_ai AFTER INSERT ON {TABLE_NAME}
+        WHEN (SELECT bulk FROM {FTS_CONTROL}) = 0 BEGIN
+            INSERT INTO {NUM_FTS_TABLE}(rowid, num_norm) VALUES (new.id, new.num_norm);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {NUM_FTS_TABLE}_ad AFTER DELETE ON {TABLE_NAME} BEGIN
+            INSERT INTO {NUM_FTS_TABLE}({NUM_FTS_TABLE}, rowid, num_norm) VALUES ('delete', old.id, old.num_norm);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {NUM_FTS_TABLE}_au AFTER UPDATE OF num_norm ON {TABLE_NAME} BEGIN
+            INSERT INTO {NUM_FTS_TABLE}({NUM_FTS_TABLE}, rowid, num_norm) VALUES ('delete', old.id, old.num_norm);
+            INSERT INTO {NUM_FTS_TABLE}(rowid, num_norm) VALUES (new.id, new.num_norm);
+        END
+    """)
+    if not existed:
+        conn.execute(f"INSERT INTO {NUM_FTS_TABLE}({NUM_FTS_TABLE}) VALUES ('rebuild')")
+
+def begin_bulk_insert(conn): # Dentro de uma transação: suspende o gatilho de INSERT do FTS
+    # O FTS5 descarrega o buffer a cada statement disparado por gatilho; em lote é ~20x mais lento.
+    # Retorna o maior id atual, para indexar depois só as linhas novas.
+    if not fts_enabled:
+        return None
+    conn.execute(f"UPDATE {FTS_CONTROL} SET bulk = 1")
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE_NAME}").fetchone()[0]
+
+def end_bulk_insert(conn, last_id): # Indexa de uma vez as linhas inseridas e religa o gatilho
+    if last_id is None:
+        return
+    conn.execute(f"INSERT INTO {FTS_TABLE}(rowid, modelo_ecu, fabricante) "
+                 f"SELECT id, modelo_ecu, fabricante FROM {TABLE_NAME} WHERE id > ?", (last_id,))
+    conn.execute(f"INSERT INTO {NUM_FTS_TABLE}(rowid, num_norm) "
+                 f"SELECT id, num_norm FROM {TABLE_NAME} WHERE id > ?", (last_id,))
+    conn.execute(f"UPDATE {FTS_CONTROL} SET bulk = 0")
+
+# ---------------- PLANO ----------------
+def _prefix_upper(prefix): # Menor string maior que todas as que começam com prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _like_escape(term): # Texto literal dentro de um padrão LIKE ... ESCAPE '\'
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fts_phrase(column, term): # Frase FTS5 restrita a uma coluna ("" escapa aspas)
+    return f'{column} : "{term.replace(chr(34), chr(34) * 2)}"'
+
+def build_where(num_bosch="", modelo="", fabricante="", grupo=None): # Escolhe o plano: (cláusula WHERE, parâmetros)
+    # grupo = (fabricante, família) exatos, como na tabela de resumo das estatísticas; None em um dos dois = qualquer
+    clauses, params, phrases = [], [], []
+    if num_bosch:
+        if any(w in num_bosch for w in WILDCARDS): # Curinga explícito: LIKE (varredura)
+            clauses.append("num_bosch LIKE ?")
+            params.append(num_bosch.replace("*", "%"))
+        elif normalize_num(num_bosch): # Prefixo (inclui exato) da chave normalizada: faixa no índice B-tree
+            norm = normalize_num(num_bosch)
+            clauses.append("num_norm >= ? AND num_norm < ?")
+            params += [norm, _prefix_upper(norm)]
+        else: # Só zeros/pontuação: prefixo do texto original
+            clauses.append("num_bosch >= ? AND num_bosch < ?")
+            params += [num_bosch, _prefix_upper(num_bosch)]
+    for column, term in (("modelo_ecu", modelo), ("fabricante", fabricante)):
+        if not term:
+            continue
+        if fts_enabled and len(term) >= TRIGRAM_MIN: # Substring pelo índice trigram
+            phrases.append(_fts_phrase(column, term))
+        else: # Termo curto (ou sem FTS): LIKE como filtro residual, com % e _ literais
+            clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f"%{_like_escape(term)}%")
+    if phrases: # Um único MATCH cobre modelo e fabricante
+        clauses.append(f"id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)")
+        params.append(" AND ".join(phrases))
+    if grupo is not None: # Mesmas expressões do índice modelos_ecu_grupo (ver estatisticas.create_schema)
+        for column, value in zip(("fabricante", "familia"), grupo):
+            if value is not None:
+                clauses.append(f"COALESCE({column}, '') = ?")
+                params.append(value)
+    return (" AND ".join(clauses) or "1=1"), params
+
+# ---------------- CONSULTAS ----------------
+def search(conn, num_bosch="", modelo="", fabricante="", grupo=None): # Mesmo contrato de main.search_ecus
+    where, params = build_where(num_bosch, modelo, fabricante, grupo)
+    return conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} "
+                        f"WHERE {where} ORDER BY id ASC", params).fetchall()
+
+def iterate(conn, num_bosch="", modelo="", fabricante="", size=5000, grupo=None): # Lotes de linhas via fetchmany
+    where, params = build_where(num_bosch, modelo, fabricante, grupo)
+    cursor = conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} "
+                          f"WHERE {where} ORDER BY id ASC", params)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+def explain(conn, num_bosch="", modelo="", fabricante="", grupo=None): # Plano escolhido pelo SQLite (depuração)
+    where, params = build_where(num_bosch, modelo, fabricante, grupo)
+    rows = conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM {TABLE_NAME} WHERE {where} ORDER BY id ASC",
+                        params).fetchall()
+    return [row[-1] for row in rows]
+
+def count(conn, num_bosch="", modelo="", fabricante="", grupo=None): # Total de linhas do filtro (sem trazer os dados)
+    where, params = build_where(num_bosch, modelo, fabricante, grupo)
+    return conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE {where}", params).fetchone()[0]
+
+def page(conn, num_bosch="", modelo="", fabricante="", after_id=0, limit=200, before_id=None, grupo=None):
+    # Paginação por chave (keyset): "id > ?" para frente, "id < ?" para trás; custo independe da posição
+    where, params = build_where(num_bosch, modelo, fabricante, grupo)
+    if before_id is not None:
+        rows = conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} "
+                            f"WHERE id < ? AND {where} ORDER BY id DESC LIMIT ?",
+                            [before_id] + params + [limit]).fetchall()
+        return rows[::-1] # Sempre em ordem crescente de id
+    return conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} "
+                        f"WHERE id > ? AND {where} ORDER BY id ASC LIMIT ?",
+                        [after_id] + params + [limit]).fetchall()
+
+LOOKUP_TABLE = "lote_consulta" # Tabela temporária (por conexão) da consulta em lote
+
+def lookup(conn, numbers): # Resolve N números num único JOIN: [(posição, número, id, num_bosch, modelo, fabricante)]
+    # Exato pela chave normalizada. Números sem ECU voltam com id None; vários modelos, várias linhas
+    with conn: # Uma transação: lote, consulta e limpeza enxergam o mesmo estado do banco
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {LOOKUP_TABLE} "
+                     f"(pos INTEGER PRIMARY KEY, num TEXT NOT NULL, norm TEXT NOT NULL)")
+        conn.executemany(f"INSERT INTO temp.{LOOKUP_TABLE} (pos, num, norm) VALUES (?, ?, ?)",
+                         ((pos, num, normalize_num(num)) for pos, num in enumerate(numbers)))
+        try:
+            return conn.execute(f"SELECT l.pos, l.num, m.id, m.num_bosch, m.modelo_ecu, m.fabricante "
+                                f"FROM temp.{LOOKUP_TABLE} l LEFT JOIN {TABLE_NAME} m ON m.num_norm = l.norm "
+                                f"ORDER BY l.pos, m.id").fetchall()
+        finally:
+            conn.execute(f"DELETE FROM temp.{LOOKUP_TABLE}")
+
+def similar(conn, num_bosch, limit=10): # Números parecidos: [(distância, id, num_bosch, modelo, fabricante)]
+    # Candidatos = linhas que dividem trigramas com a chave (ordenadas pelo FTS5, mais trigramas em comum
+    # primeiro); depois ordena pela distância de edição real
+    norm = normalize_num(num_bosch)
+    if len(norm) < TRIGRAM_MIN:
+        return []
+    columns = "m.id, m.num_bosch, m.modelo_ecu, m.fabricante, m.num_norm"
+    if fts_enabled:
+        grams = sorted({norm[i:i + TRIGRAM_MIN] for i in range(len(norm) - TRIGRAM_MIN + 1)})
+        candidates = conn.execute(
+            f"SELECT {columns} FROM {NUM_FTS_TABLE} f JOIN {TABLE_NAME} m ON m.id = f.rowid "
+            f"WHERE {NUM_FTS_TABLE} MATCH ? ORDER BY f.rank LIMIT ?",
+            (" OR ".join(f'"{g}"' for g in grams), SIMILAR_CANDIDATES)).fetchall()
+    else: # Sem FTS5: compara com todas as chaves de tamanho próximo
+        candidates = conn.execute(f"SELECT {columns} FROM {TABLE_NAME} m WHERE length(m.num_norm) BETWEEN ? AND ?",
+                                  (len(norm) - SIMILAR_MAX_DISTANCE, len(norm) + SIMILAR_MAX_DISTANCE)).fetchall()
+    ranked = []
+    for row_id, num, model, fabri, key in candidates:
+        distance = edit_distance(norm, key or "", SIMILAR_MAX_DISTANCE)
+        if distance <= SIMILAR_MAX_DISTANCE:
+            ranked.append((distance, row_id, num, model, fabri))
+    ranked.sort()
+    return ranked[:limit]
+
+def matches(row, num_bosch="", modelo="", fabricante=""): # Avalia o filtro numa linha já lida (sem SQL)
+    # Mesma semântica de build_where: prefixo/curinga no número, substring sem caixa no resto
+    _, num, model, fabri = row
+    if num_bosch:
+        if any(w in num_bosch for w in WILDCARDS):
+            pattern = num_bosch.replace("*", "%").replace("%", "*").replace("_", "?").lower()
+            if not fnmatch.fnmatchcase(num.lower(), pattern):
+                return False
+        elif normalize_num(num_bosch):
+            if not normalize_num(num).startswith(normalize_num(num_bosch)):
+                return False
+        elif not num.startswith(num_bosch):
+            return False
+    for value, term in ((model, modelo), (fabri, fabricante)):
+        if term and term.lower() not in (value or "").lower():
+            return False
+    return True
+
+# ---------------- CACHE ----------------
+# Resultados recentes por filtro, válidos enquanto a geração não muda.
+# Toda escrita deste processo chama bump_generation(); escritas de outros processos (sincronização,
+# importação pela linha de comando, outro gerenciador aberto) mudam a versão persistente do banco.
+_generation = 0
+_stored = None # Última versão persistente vista (ao mudar, o cache inteiro é descartado)
+_cache = OrderedDict() # (geração, chave) -> resultado, do menos ao mais recente
+_cache_lock = threading.Lock()
+
+def generation(conn): # Geração atual dos dados: (contador do processo, versão persistente do banco)
+    return _generation, conn.execute(f"SELECT versao FROM {VERSION_TABLE}").fetchone()[0]
+
+def _check_stored(stored): # Com _cache_lock: outro processo gravou desde a última consulta?
+    global _stored
+    if stored != _stored:
+        _stored = stored
+        _cache.clear()
+
+def bump_generation(): # Invalida o cache (chamar após qualquer escrita)
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+
+def cache_get(key, conn): # Resultado guardado para a chave na geração atual (ou None)
+    gen = generation(conn)
+    with _cache_lock:
+        _check_stored(gen[1])
+        entry = (gen, key)
+        if entry not in _cache:
+            return None
+        _cache.move_to_end(entry)
+        return _cache[entry]
+
+def cache_put(key, value, gen): # Guarda o resultado calculado na geração gen (descarta se já mudou)
+    with _cache_lock:
+        if gen[0] != _generation or (_stored is not None and gen[1] < _stored):
+            return
+        _check_stored(gen[1])
+        _cache[(gen, key)] = value
+        _cache.move_to_end((gen, key))
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False) # Remove o usado há mais tempo
@@ -0,0 +1,108 @@
+"""
+Camada de sessão SQLite compartilhada (ECU Manager)
+Uma conexão longa por thread e por arquivo, com pragmas ajustados e schema criado uma única vez.
+"""
+
+import os, sys, sqlite3, threading, atexit
+
+# Pragmas aplicados em toda conexão nova
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL", # Leitores não bloqueiam o escritor (e vice-versa)
+    "PRAGMA synchronous=NORMAL", # Em WAL basta sincronizar no checkpoint
+    "PRAGMA cache_size=-16000", # ~16 MB de cache de páginas
+    "PRAGMA mmap_size=268435456", # Até 256 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY", # Tabelas temporárias em memória
+)
+# Banco em compartilhamento de rede (SMB): WAL exige memória compartilhada no mesmo computador, e mmap/
+# synchronous=NORMAL não são seguros em arquivo remoto. Journal clássico (DELETE) e sincronização completa
+PRAGMAS_REDE = (
+    "PRAGMA journal_mode=DELETE",
+    "PRAGMA synchronous=FULL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+BUSY_TIMEOUT = 10 # Segundos esperando um lock antes de desistir
+STATEMENT_CACHE = 256 # Statements preparados reaproveitados por conexão
+
+_local = threading.local() # Conexões da thread atual: {caminho: conexão}
+_all = [] # Todas as conexões abertas (para fechar na saída)
+_ready = set() # Caminhos cujo schema já foi criado neste processo
+_lock = threading.Lock()
+
+def _open(path, wal=True): # Abre e configura uma conexão
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE)
+    if wal:
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    try:
+        mode = conn.execute(PRAGMAS_REDE[0]).fetchone()[0]
+    except sqlite3.OperationalError as e: # Outra conexão aberta impede sair do WAL
+        if not is_busy(e):
+            conn.close()
+            raise
+        mode = "wal"
+    if mode.lower() == "wal": # Abrir em WAL pela rede arriscaria corromper o arquivo
+        conn.close()
+        raise sqlite3.OperationalError(f"{path}: banco em uso em modo WAL; feche o gerenciador na outra "
+                                       f"máquina ou copie o arquivo para esta antes de sincronizar")
+    for pragma in PRAGMAS_REDE[1:]:
+        conn.execute(pragma)
+    return conn
+
+def is_network_path(path): # Caminho num compartilhamento de rede (\\servidor\pasta ou unidade mapeada no Windows)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4 # DRIVE_REMOTE
+    return False
+
+def get_connection(path, setup=None, wal=True): # Conexão da thread atual para o arquivo (criada na 1ª chamada)
+    # wal=False: banco em compartilhamento de rede (ver PRAGMAS_REDE); vale para a 1ª abertura na thread
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _open(path, wal)
+        with _lock:
+            _all.append(conn)
+    if setup is not None and path not in _ready:
+        with _lock:
+            if path not in _ready: # Schema roda uma vez por processo
+                with conn:
+                    setup(conn)
+                _ready.add(path)
+    return conn
+
+def close_thread_connections(): # Fecha as conexões da thread atual (fim de uma thread de trabalho)
+    conns = getattr(_local, "conns", {})
+    for conn in conns.values():
+        with _lock:
+            if conn in _all:
+                _all.remove(conn)
+        conn.close()
+    conns.clear()
+
+def is_busy(error): # Lock de outra conexão que não saiu dentro do timeout ("database is locked")
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+def reset(path=None): # Esquece o schema criado (ex.: arquivo substituído ou trocado em testes)
+    with _lock:
+        if path is None:
+            _ready.clear()
+        else:
+            _ready.discard(path)
+
+@atexit.register
+def close_all(): # Fecha tudo na saída (faz o checkpoint do WAL)
+    with _lock:
+        conns = list(_all)
+        _all.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError: # Conexão de outra thread
+            pass
@@ -0,0 +1,151 @@
+"""
+Linha de comando do catálogo de ECUs (sem janela, para rotinas agendadas)
+Usa as mesmas funções de banco do main.py.
+
+Uso:
+    python -m ecu_manager lookup numeros.txt --formato csv     # ou via stdin: ... | python -m ecu_manager lookup
+    python -m ecu_manager lookup numeros.txt --aproximado      # sugere números parecidos para os não encontrados
+    python -m ecu_manager import lista1.csv lista2.csv [--limpar]
+    python -m ecu_manager export saida.csv.gz [--num 0281 --modelo EDC17]
+    python -m ecu_manager stats [--formato json]
+"""
+
+import argparse, csv, json, os, sqlite3, sys
+
+import main, limpeza
+
+FORMATOS = ("json", "csv")
+TOP_FABRICANTES = 10 # Fabricantes e famílias listados em "stats"
+
+# ---------------- LOOKUP ----------------
+def ler_numeros(arquivo): # Um número por linha (ou 1ª coluna de um CSV); ignora vazios e cabeçalho
+    for linha in arquivo:
+        numero = linha.split(",", 1)[0].strip().strip('"')
+        if numero and numero.lower() not in ("num_bosch", "numerobosch"):
+            yield numero
+
+def agrupar(linhas): # Linhas do JOIN -> [{consulta, encontrado, ecus: [...]}] na ordem da entrada
+    resultado = []
+    for pos, numero, row_id, num_bosch, modelo, fabricante in linhas:
+        if not resultado or resultado[-1]["_pos"] != pos:
+            resultado.append({"_pos": pos, "consulta": numero, "encontrado": False, "ecus": []})
+        if row_id is not None:
+            resultado[-1]["encontrado"] = True
+            resultado[-1]["ecus"].append({"id": row_id, "num_bosch": num_bosch, "modelo_ecu": modelo,
+                                          "fabricante": fabricante})
+    for item in resultado:
+        del item["_pos"]
+    return resultado
+
+def cmd_lookup(args):
+    if args.arquivo in (None, "-"):
+        numeros = list(ler_numeros(sys.stdin))
+    else:
+        with open(args.arquivo, encoding="utf-8-sig") as f:
+            numeros = list(ler_numeros(f))
+    linhas = main.lookup_ecus(numeros)
+    if args.formato == "csv":
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(("consulta", "id", "num_bosch", "modelo_ecu", "fabricante"))
+        for _, numero, *ecu in linhas:
+            writer.writerow([numero] + ["" if v is None else v for v in ecu])
+    else:
+        resultado = agrupar(linhas)
+        if args.aproximado: # Sugestões por distância de edição para o que não foi encontrado
+            for item in resultado:
+                if not item["encontrado"]:
+                    item["parecidos"] = [{"distancia": d, "id": row_id, "num_bosch": num, "modelo_ecu": modelo,
+                                          "fabricante": fabricante}
+                                         for d, row_id, num, modelo, fabricante in main.similar_ecus(item["consulta"])]
+        json.dump(resultado, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    faltando = len({pos for pos, _, row_id, *_ in linhas if row_id is None})
+    print(f"🔎 {len(numeros)} números · {len(numeros) - faltando} encontrados · {faltando} sem cadastro",
+          file=sys.stderr)
+
+# ---------------- IMPORT / EXPORT ----------------
+def cmd_import(args):
+    for caminho in args.arquivos:
+        if args.limpar: # Passa pela limpeza (aspas, cabeçalhos, duplicados) antes de gravar
+            report = limpeza.importar_no_banco(limpeza.limpar(caminho), main.DB_FILE)
+        else:
+            report = main.import_csv_bulk(caminho)
+        print(f"📥 {caminho}: {report!r}", file=sys.stderr)
+
+def cmd_export(args):
+    report = main.export_ecus(args.saida, args.num, args.modelo, args.fabricante)
+    print(f"📤 {report!r}", file=sys.stderr)
+
+# ---------------- STATS ----------------
+def coletar_stats(): # Números gerais do catálogo (totais pela tabela de resumo do estatisticas.py)
+    conn = main.get_connection()
+    (total, n_fabricantes, n_familias), fabricantes, familias = main.ecu_stats(TOP_FABRICANTES)
+    distintos = conn.execute(f"SELECT COUNT(DISTINCT num_bosch) FROM {main.TABLE_NAME}").fetchone()[0]
+    return {
+        "banco": main.DB_FILE,
+        "tamanho_mb": round(os.path.getsize(main.DB_FILE) / 2**20, 2),
+        "ecus": total,
+        "numeros_bosch_distintos": distintos,
+        "total_fabricantes": n_fabricantes,
+        "total_familias": n_familias,
+        "fabricantes": dict(fabricantes),
+        "familias": dict(familias),
+        "busca_fts": main.busca.fts_enabled,
+    }
+
+def cmd_stats(args):
+    stats = coletar_stats()
+    if args.formato == "json":
+        json.dump(stats, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(("chave", "valor"))
+    for chave, valor in stats.items():
+        if chave in ("fabricantes", "familias"):
+            writer.writerows((f"{chave[:-1]}:{nome}", n) for nome, n in valor.items())
+        else:
+            writer.writerow((chave, valor))
+
+# ---------------- MAIN ----------------
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="ecu_manager", description="Catálogo de ECUs pela linha de comando.")
+    parser.add_argument("--db", default=main.DB_FILE, help=f"Banco SQLite (padrão: {main.DB_FILE})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("lookup", help="Consulta vários números Bosch de uma vez")
+    p.add_argument("arquivo", nargs="?", help="Arquivo com um número por linha (padrão: stdin)")
+    p.add_argument("--formato", choices=FORMATOS, default="json")
+    p.add_argument("--aproximado", action="store_true", help="Inclui números parecidos para os não encontrados (json)")
+    p.set_defaults(func=cmd_lookup)
+
+    p = sub.add_parser("import", help="Importa CSVs em massa")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--limpar", action="store_true", help="Aplica a limpeza do limpeza.py antes de importar")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="Exporta o catálogo (csv, csv.gz, parquet, arrow pela extensão)")
+    p.add_argument("saida")
+    p.add_argument("--num", default="", help="Prefixo do número Bosch (aceita *)")
+    p.add_argument("--modelo", default="")
+    p.add_argument("--fabricante", default="")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("stats", help="Totais do catálogo")
+    p.add_argument("--formato", choices=FORMATOS, default="json")
+    p.set_defaults(func=cmd_stats)
+    return parser
+
+def run(argv=None):
+    args = criar_parser().parse_args(argv)
+    main.DB_FILE = args.db
+    try:
+        main.init_db()
+        args.func(args)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run())
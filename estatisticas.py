@@ -0,0 +1,90 @@
+"""
+Estatísticas do catálogo por fabricante e por família de modelo (MED17, EDC16, ...)
+Uma tabela de resumo (fabricante, família, total) é mantida por gatilhos: o painel lê poucas
+linhas em vez de agrupar modelos_ecu inteira a cada abertura.
+"""
+
+import re
+from functools import lru_cache
+
+import busca
+
+SUMMARY_TABLE = "modelos_ecu_resumo" # (fabricante, familia) -> total de ECUs
+TOP_N = 15 # Linhas mostradas por lista no painel
+SEM_FAMILIA = "OUTROS" # Modelo que não começa por letras (ex.: só números)
+
+_FAMILIA = re.compile(r"[A-Z]+\d*")
+_SEPARADORES = re.compile(r"[\s_-]+")
+
+@lru_cache(maxsize=4096) # Poucos modelos distintos se repetem em milhares de linhas
+def familia(modelo): # "MED17.5.20" -> "MED17", "EDC16C39" -> "EDC16", "me 7.5" -> "ME7"
+    m = _FAMILIA.match(_SEPARADORES.sub("", (modelo or "").upper()))
+    return m.group() if m else SEM_FAMILIA
+
+# ---------------- SCHEMA ----------------
+def create_schema(conn): # Resumo + gatilhos (requer a coluna familia, ver main._migrate_derived)
+    existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (SUMMARY_TABLE,)).fetchone()
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+            fabricante TEXT NOT NULL,
+            familia TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (fabricante, familia)
+        ) WITHOUT ROWID
+    """)
+    soma = f"""INSERT INTO {SUMMARY_TABLE} (fabricante, familia, total)
+               VALUES (COALESCE(new.fabricante, ''), COALESCE(new.familia, ''), 1)
+               ON CONFLICT (fabricante, familia) DO UPDATE SET total = total + 1;"""
+    subtrai = f"""UPDATE {SUMMARY_TABLE} SET total = total - 1
+                  WHERE fabricante = COALESCE(old.fabricante, '') AND familia = COALESCE(old.familia, '');
+                  DELETE FROM {SUMMARY_TABLE}
+                  WHERE fabricante = COALESCE(old.fabricante, '') AND familia = COALESCE(old.familia, '')
+                        AND total <= 0;"""
+    # Importações em massa suspendem o gatilho de INSERT (mesma flag do FTS); ver registrar_lote
+    em_lote = f"WHEN (SELECT bulk FROM {busca.FTS_CONTROL}) = 0 " if busca.fts_enabled else ""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {SUMMARY_TABLE}_ai AFTER INSERT ON {busca.TABLE_NAME} "
+                 f"{em_lote}BEGIN {soma} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {SUMMARY_TABLE}_ad AFTER DELETE ON {busca.TABLE_NAME} "
+                 f"BEGIN {subtrai} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {SUMMARY_TABLE}_au AFTER UPDATE OF fabricante, familia "
+                 f"ON {busca.TABLE_NAME} BEGIN {subtrai} {soma} END")
+    # Filtro exato do painel (busca.build_where com grupo): família sozinha ou família + fabricante
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {busca.TABLE_NAME}_grupo "
+                 f"ON {busca.TABLE_NAME}(COALESCE(familia, ''), COALESCE(fabricante, ''))")
+    if not existed: # Banco antigo: resumo das linhas que já existem
+        reconstruir(conn)
+
+def reconstruir(conn): # Recalcula o resumo inteiro (um GROUP BY)
+    conn.execute(f"DELETE FROM {SUMMARY_TABLE}")
+    conn.execute(f"INSERT INTO {SUMMARY_TABLE} (fabricante, familia, total) "
+                 f"SELECT COALESCE(fabricante, ''), COALESCE(familia, ''), COUNT(*) FROM {busca.TABLE_NAME} "
+                 f"GROUP BY 1, 2")
+
+def registrar_lote(conn, last_id): # Fim de importação em massa: soma as linhas novas agrupadas
+    if last_id is None: # Sem FTS o gatilho não é suspenso
+        return
+    conn.execute(f"INSERT INTO {SUMMARY_TABLE} (fabricante, familia, total) "
+                 f"SELECT COALESCE(fabricante, ''), COALESCE(familia, ''), COUNT(*) FROM {busca.TABLE_NAME} "
+                 f"WHERE id > ? GROUP BY 1, 2 ON CONFLICT (fabricante, familia) DO UPDATE SET total = total + excluded.total",
+                 (last_id,))
+
+def no_grupo(row, grupo): # A linha (id, num, modelo, fabricante) pertence ao grupo do painel? (ver busca.build_where)
+    if grupo is None:
+        return True
+    fabricante, fam = grupo
+    return (fabricante is None or (row[3] or "") == fabricante) and (fam is None or familia(row[2]) == fam)
+
+# ---------------- CONSULTAS ----------------
+def totais(conn): # (ECUs, fabricantes, famílias)
+    return conn.execute(f"SELECT COALESCE(SUM(total), 0), COUNT(DISTINCT fabricante), COUNT(DISTINCT familia) "
+                        f"FROM {SUMMARY_TABLE}").fetchone()
+
+def top_fabricantes(conn, n=TOP_N, familia=None): # [(fabricante, total)], opcionalmente de uma família
+    where, params = ("WHERE familia = ? ", [familia]) if familia is not None else ("", [])
+    return conn.execute(f"SELECT fabricante, SUM(total) FROM {SUMMARY_TABLE} {where}"
+                        f"GROUP BY fabricante ORDER BY SUM(total) DESC, fabricante LIMIT ?", params + [n]).fetchall()
+
+def top_familias(conn, n=TOP_N, fabricante=None): # [(família, total)], opcionalmente de um fabricante
+    where, params = ("WHERE fabricante = ? ", [fabricante]) if fabricante is not None else ("", [])
+    return conn.execute(f"SELECT familia, SUM(total) FROM {SUMMARY_TABLE} {where}"
+                        f"GROUP BY familia ORDER BY SUM(total) DESC, familia LIMIT ?", params + [n]).fetchall()
@@ -0,0 +1,159 @@
+"""
+Extração paralela da tabela REF/MODELE do PDF de números Bosch (substitui o pdf.ipynb)
+Cada página é lida pelo camelot (flavor "stream") num processo separado; o resultado
+fica em cache por (hash do PDF, página), então uma nova execução só processa o que falta.
+
+Uso:
+    python extrair_pdf.py Numeros_Bosch.pdf -o dados_filtrados_bosch.csv
+    python extrair_pdf.py Numeros_Bosch.pdf --db ecus.db --paginas 1-50
+"""
+
+import argparse, csv, hashlib, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+
+import limpeza
+
+ARQUIVO_PDF = "Numeros_Bosch.pdf"
+ARQUIVO_CSV = "dados_filtrados_bosch.csv"
+PASTA_CACHE = ".cache_pdf" # Um JSON por página: .cache_pdf/<sha256 do PDF>/<página>.json
+CABECALHO = ("REF", "MODELE") # Colunas procuradas em cada tabela
+COLUNAS_PADRAO = (0, 1) # Só a 1ª página traz o cabeçalho; as demais seguem o mesmo layout
+
+def hash_pdf(caminho): # sha256 do arquivo, lido em blocos
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def contar_paginas(caminho): # Usa o leitor de PDF que acompanha a versão do camelot instalada
+    try:
+        import pypdfium2
+        return len(pypdfium2.PdfDocument(caminho))
+    except ImportError:
+        from pypdf import PdfReader
+        return len(PdfReader(caminho).pages)
+
+def intervalo_paginas(texto, total): # "1-10,15" -> [1..10, 15]; None = todas
+    if not texto:
+        return list(range(1, total + 1))
+    paginas = []
+    for parte in texto.split(","):
+        inicio, _, fim = parte.partition("-")
+        paginas += range(int(inicio), min(int(fim or inicio), total) + 1)
+    return sorted(set(paginas))
+
+# ---------------- EXTRAÇÃO (processos) ----------------
+def _achar_cabecalho(linhas): # (índice da linha, col. REF, col. MODELE) ou None
+    for i, linha in enumerate(linhas):
+        celulas = [str(c).strip().upper() for c in linha]
+        if all(nome in celulas for nome in CABECALHO):
+            return i, celulas.index(CABECALHO[0]), celulas.index(CABECALHO[1])
+    return None
+
+def extrair_pagina(caminho, pagina): # Roda no processo filho: [(ref, modelo), ...] da página
+    import camelot # Pesado: só nos processos que extraem
+    registros = []
+    for tabela in camelot.read_pdf(caminho, pages=str(pagina), flavor="stream"):
+        linhas = tabela.df.values.tolist()
+        achado = _achar_cabecalho(linhas) # Cabeçalho detectado por tabela (não por posição fixa)
+        if achado is not None:
+            inicio, col_ref, col_modelo = achado
+            linhas = linhas[inicio + 1:]
+        elif tabela.df.shape[1] == len(COLUNAS_PADRAO):
+            col_ref, col_modelo = COLUNAS_PADRAO
+        else: # Tabela sem cabeçalho e com outro layout: não é a lista de números
+            continue
+        for linha in linhas:
+            ref, modelo = str(linha[col_ref]).strip(), str(linha[col_modelo]).strip()
+            if not ref and modelo == str(pagina): # Número da página impresso no topo
+                continue
+            if ref or modelo:
+                registros.append((ref, modelo))
+    return registros
+
+# ---------------- CACHE ----------------
+def _arquivo_cache(pasta, pagina):
+    return os.path.join(pasta, f"{pagina}.json")
+
+def ler_cache(pasta, pagina):
+    try:
+        with open(_arquivo_cache(pasta, pagina), encoding="utf-8") as f:
+            return [tuple(r) for r in json.load(f)]
+    except (OSError, ValueError):
+        return None
+
+def gravar_cache(pasta, pagina, registros):
+    os.makedirs(pasta, exist_ok=True)
+    temporario = _arquivo_cache(pasta, pagina) + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(registros, f, ensure_ascii=False)
+    os.replace(temporario, _arquivo_cache(pasta, pagina)) # Nunca deixa um JSON pela metade
+
+# ---------------- PIPELINE ----------------
+class Progresso: # Contadores da extração
+    def __init__(self):
+        self.paginas = 0
+        self.do_cache = 0
+        self.extraidas = 0
+
+def extrair(caminho, paginas=None, processos=None, usar_cache=True, progresso=None):
+    # Gera (página, ref, modelo) na ordem das páginas, extraindo em paralelo só o que não está em cache
+    progresso = progresso if progresso is not None else Progresso()
+    pasta = os.path.join(PASTA_CACHE, hash_pdf(caminho))
+    lista = intervalo_paginas(paginas, contar_paginas(caminho))
+    progresso.paginas = len(lista)
+    em_cache = {p: ler_cache(pasta, p) for p in lista} if usar_cache else {}
+    faltando = [p for p in lista if em_cache.get(p) is None]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        futuros = {p: pool.submit(extrair_pagina, caminho, p) for p in faltando}
+        for pagina in lista: # Ordem do PDF (as demais páginas seguem rodando em paralelo)
+            registros = em_cache.get(pagina)
+            if registros is None:
+                registros = futuros[pagina].result()
+                gravar_cache(pasta, pagina, registros)
+                progresso.extraidas += 1
+            else:
+                progresso.do_cache += 1
+            for ref, modelo in registros:
+                yield pagina, ref, modelo
+
+def registros_limpos(caminho, stats, **opcoes): # Formato de limpeza.py/main.import_rows: (nº, num, modelo, fabricante)
+    brutos = ((i, ref, modelo, "") for i, (_, ref, modelo) in enumerate(extrair(caminho, **opcoes), 1))
+    return limpeza.validar(limpeza.deduplicar(limpeza.aparar(brutos), stats), stats)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrai REF/MODELE do PDF de números Bosch.")
+    parser.add_argument("pdf", nargs="?", default=ARQUIVO_PDF)
+    parser.add_argument("-o", "--saida", help=f"CSV de saída (padrão: {ARQUIVO_CSV} quando --db não é usado)")
+    parser.add_argument("--db", help="Importa direto neste banco SQLite (ex.: ecus.db)")
+    parser.add_argument("--paginas", help="Intervalo de páginas, ex.: 1-50,60")
+    parser.add_argument("--processos", type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument("--sem-cache", action="store_true", help="Ignora o cache e extrai todas as páginas")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    stats, progresso = limpeza.Estatisticas(), Progresso()
+    registros = registros_limpos(args.pdf, stats, paginas=args.paginas, processos=args.processos,
+                                 usar_cache=not args.sem_cache, progresso=progresso)
+    if args.db:
+        if args.saida:
+            registros = limpeza.copiar_para_csv(registros, args.saida)
+        report = limpeza.importar_no_banco(registros, args.db)
+        print(f"✅ Banco {args.db}: {report.summary().replace(chr(10), ', ')}")
+    else:
+        saida = args.saida or ARQUIVO_CSV
+        with open(saida, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(("num_bosch", "modelo_ecu"))
+            total = 0
+            for _, num, modelo, _ in registros:
+                writer.writerow((num, modelo))
+                total += 1
+        print(f"✅ Arquivo '{saida}' gerado com sucesso! ({total} linhas válidas)")
+    print(f"📄 Páginas: {progresso.paginas} ({progresso.extraidas} extraídas, {progresso.do_cache} do cache) · "
+          f"duplicados: {stats.duplicados} · inválidos: {len(stats.invalidos)} · "
+          f"{time.perf_counter() - inicio:.1f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
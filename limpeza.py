@@ -1,34 +1,20 @@
-import pandas as pd
+"""
+Limpeza de listas de ECUs em streaming (sem pandas, sem arquivo temporário)
+Etapas: aspas -> cabeçalho -> espaços -> duplicados -> validação. Cada etapa é um gerador.
 
-arquivo_original = "bosch_ecu_final.csv"
-arquivo_limpo = "bosch_ecu_limpo.csv"
+Uso:
+    python limpeza.py bosch_ecu_final.csv -o bosch_ecu_limpo.csv
+    python limpeza.py bosch_ecu_final.csv --db ecus.db      # importa direto no banco
+"""
 
-# Lê o arquivo como texto bruto para corrigir aspas e espaços
-with open(arquivo_original, "r", encoding="utf-8", errors="ignore") as f:
-    linhas = f.readlines()
+import argparse, csv, sys, time
+import busca
 
-# Remove aspas problemáticas e espaços extras
-linhas_limpas = []
-for linha in linhas:
-    linha = linha.replace('",', ',')   # remove aspas antes de vírgula
-    linha = linha.replace(',"', ',')   # remove aspas depois de vírgula
-    linha = linha.replace('"', '')     # remove aspas isoladas
-    linha = linha.strip()              # remove quebras e espaços
-    if linha:
-        linhas_limpas.append(linha)
+ARQUIVO_ORIGINAL = "bosch_ecu_final.csv"
+ARQUIVO_LIMPO = "bosch_ecu_limpo.csv"
+COLUNAS = ("num_bosch", "modelo_ecu", "fabricante")
 
-# Salva um CSV temporário sem aspas quebradas
-arquivo_temp = "bosch_ecu_temp.csv"
-with open(arquivo_temp, "w", encoding="utf-8") as f:
-    f.write("\n".join(linhas_limpas))
-
-# Agora lê normalmente com pandas
-df = pd.read_csv(arquivo_temp, sep=",", engine="python", on_bad_lines="skip")
-
-print("Colunas detectadas:", df.columns.tolist())
-
-# Renomeia para padronizar
-df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+# Apelidos de cabeçalho -> nome padronizado (após minúsculas e "_" no lugar de espaços)
 renomear = {
     'numerobosch': 'num_bosch',
     'numero_bosch': 'num_bosch',
@@ -37,23 +23,166 @@ renomear = {
     'ecu': 'modelo_ecu',
     'fabricanteecu': 'fabricante',
 }
-df.rename(columns=renomear, inplace=True)
 
-# Filtra apenas colunas importantes
-df = df[[c for c in df.columns if any(k in c for k in ['bosch', 'modelo', 'fabricante'])]]
-df.columns = ['num_bosch', 'modelo_ecu', 'fabricante'][:len(df.columns)]
+class Estatisticas: # Contadores preenchidos pelas etapas
+    def __init__(self):
+        self.colunas = [] # Cabeçalho detectado
+        self.duplicados = 0
+        self.invalidos = [] # Números de linha descartados na validação
+        self.tempos = [] # (etapa, segundos, itens que saíram)
+
+# ---------------- ETAPAS ----------------
+def ler_linhas(caminho): # (linha, texto) sem carregar o arquivo inteiro
+    with open(caminho, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for numero, texto in enumerate(f, 1):
+            yield numero, texto
+
+def reparar_aspas(linhas): # Remove aspas problemáticas e linhas vazias
+    for numero, texto in linhas:
+        texto = texto.replace('",', ',')   # remove aspas antes de vírgula
+        texto = texto.replace(',"', ',')   # remove aspas depois de vírgula
+        texto = texto.replace('"', '')     # remove aspas isoladas
+        texto = texto.strip()              # remove quebras e espaços
+        if texto:
+            yield numero, texto.split(",")
+
+def _nome_padrao(coluna):
+    nome = coluna.strip().lower().replace(" ", "_")
+    return renomear.get(nome, nome)
+
+def mapear_cabecalho(registros, stats): # 1º registro = cabeçalho; demais viram (linha, num, modelo, fabricante)
+    indices = None
+    for numero, campos in registros:
+        if indices is None:
+            nomes = [_nome_padrao(c) for c in campos]
+            stats.colunas = nomes
+            indices = [nomes.index(c) if c in nomes else None for c in COLUNAS]
+            if indices[0] is None or indices[1] is None:
+                raise ValueError(f"Cabeçalho sem num_bosch/modelo_ecu: {campos}")
+            continue
+        yield (numero,) + tuple(campos[i] if i is not None and i < len(campos) else "" for i in indices)
+
+def aparar(registros): # Remove espaços das pontas de cada campo
+    for numero, num, modelo, fabricante in registros:
+        yield numero, num.strip(), modelo.strip(), fabricante.strip()
+
+def deduplicar(registros, stats): # Mantém a 1ª ocorrência de cada (num_bosch normalizado, modelo_ecu)
+    vistos = set() # Único estado que cresce: uma chave por ECU distinta
+    for registro in registros:
+        chave = (busca.normalize_num(registro[1]), registro[2])
+        if chave in vistos:
+            stats.duplicados += 1
+            continue
+        vistos.add(chave)
+        yield registro
+
+def validar(registros, stats): # Exige num_bosch e modelo_ecu preenchidos
+    for registro in registros:
+        if registro[1] and registro[2]:
+            yield registro
+        else:
+            stats.invalidos.append(registro[0])
+
+# ---------------- PIPELINE ----------------
+class _Cronometro: # Mede o tempo gasto em next() (inclui as etapas anteriores)
+    def __init__(self, iterador):
+        self.iterador = iterador
+        self.tempo = 0.0
+        self.itens = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            item = next(self.iterador)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+        self.itens += 1
+        return item
+
+def limpar(caminho, stats=None): # Gera registros limpos (linha, num_bosch, modelo_ecu, fabricante)
+    stats = stats if stats is not None else Estatisticas()
+    etapas = [
+        ("aspas", reparar_aspas),
+        ("cabeçalho", lambda r: mapear_cabecalho(r, stats)),
+        ("espaços", aparar),
+        ("duplicados", lambda r: deduplicar(r, stats)),
+        ("validação", lambda r: validar(r, stats)),
+    ]
+    cronometros = [("leitura", _Cronometro(ler_linhas(caminho)))]
+    for nome, etapa in etapas:
+        cronometros.append((nome, _Cronometro(etapa(cronometros[-1][1]))))
+    try:
+        yield from cronometros[-1][1]
+    finally: # Tempo próprio de cada etapa = tempo acumulado - tempo da etapa anterior
+        anterior = 0.0
+        for nome, cronometro in cronometros:
+            stats.tempos.append((nome, cronometro.tempo - anterior, cronometro.itens))
+            anterior = cronometro.tempo
+
+def salvar_csv(registros, caminho): # Grava o CSV limpo; retorna a quantidade de linhas
+    total = 0
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUNAS)
+        for _, num, modelo, fabricante in registros:
+            writer.writerow((num, modelo, fabricante))
+            total += 1
+    return total
+
+def importar_no_banco(registros, caminho_db): # Alimenta o importador em massa do main.py
+    import main # Só quando o banco é usado
+    main.DB_FILE = caminho_db
+    main.init_db()
+    padrao = main.FABRICANTE_PADRAO
+    return main.import_rows((n, num, modelo, fabricante or padrao) for n, num, modelo, fabricante in registros)
+
+def imprimir_tempos(stats):
+    print("\n⏱️  Tempo por etapa:")
+    for nome, segundos, itens in stats.tempos:
+        print(f"   {nome:<11} {segundos * 1000:9.1f} ms  {itens:>9} saídas")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Limpa uma lista de ECUs (CSV) em streaming.")
+    parser.add_argument("entrada", nargs="?", default=ARQUIVO_ORIGINAL, help="CSV de origem")
+    parser.add_argument("-o", "--saida", help=f"CSV limpo (padrão: {ARQUIVO_LIMPO} quando --db não é usado)")
+    parser.add_argument("--db", help="Importa os registros limpos neste banco SQLite (ex.: ecus.db)")
+    args = parser.parse_args(argv)
 
-# Remove espaços e nulos
-for col in df.columns:
-    df[col] = df[col].astype(str).str.strip()
+    stats = Estatisticas()
+    registros = limpar(args.entrada, stats)
+    inicio = time.perf_counter()
+    try:
+        _executar(args, registros)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    print("Colunas detectadas:", stats.colunas)
+    print(f"Duplicados removidos: {stats.duplicados} · Inválidos: {len(stats.invalidos)}")
+    imprimir_tempos(stats)
+    print(f"   {'total':<11} {(time.perf_counter() - inicio) * 1000:9.1f} ms")
 
-df.dropna(subset=["num_bosch", "modelo_ecu"], inplace=True)
-df.drop_duplicates(subset=["num_bosch", "modelo_ecu"], inplace=True)
+def _executar(args, registros): # Destino: banco (com cópia CSV opcional) ou só CSV
+    if args.db:
+        if args.saida: # Grava o CSV e importa na mesma passada
+            registros = copiar_para_csv(registros, args.saida)
+        report = importar_no_banco(registros, args.db)
+        print(f"✅ Banco {args.db}: {report.summary().replace(chr(10), ', ')}")
+    else:
+        saida = args.saida or ARQUIVO_LIMPO
+        total = salvar_csv(registros, saida)
+        print(f"✅ Linhas válidas: {total}")
+        print(f"✅ Arquivo limpo salvo como: {saida}")
 
-# Mostra resultado
-print(f"\n✅ Linhas válidas: {len(df)}")
-print(df.head(10))
+def copiar_para_csv(registros, caminho): # Repassa os registros gravando uma cópia em CSV
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUNAS)
+        for registro in registros:
+            writer.writerow(registro[1:])
+            yield registro
 
-# Salva o novo CSV limpo
-df.to_csv(arquivo_limpo, index=False, encoding="utf-8")
-print(f"\n✅ Arquivo limpo salvo como: {arquivo_limpo}")
+if __name__ == "__main__":
+    sys.exit(main())
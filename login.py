@@ -1,29 +1,23 @@
 #!/usr/bin/env python3
+import time
+_INICIO = time.perf_counter() # Referência do relatório de inicialização
+_tempos = [] # (etapa, segundos desde _INICIO)
+
+def marcar(etapa): # Registra o fim de uma etapa da inicialização
+    _tempos.append((etapa, time.perf_counter() - _INICIO))
+
 import customtkinter as ctk
 from tkinter import messagebox
-import sqlite3, os, subprocess, re, hashlib, sys, secrets
-
-DB_USERS = "usuarios.db" # Caminho do banco de dados
+marcar("import customtkinter/tkinter")
+import sqlite3, os, re, sys
+import autenticacao
+# Padrão: o gerenciador abre no mesmo processo e na mesma janela. O modo antigo
+# (main.py/main.exe num processo separado) continua disponível com --processo-separado.
+PROCESSO_SEPARADO = "--processo-separado" in sys.argv or os.environ.get("ECU_PROCESSO_SEPARADO") == "1"
+MOSTRAR_TEMPOS = "--tempos" in sys.argv or os.environ.get("ECU_TEMPOS") == "1"
 
 # ------------------ BANCO DE USUÁRIOS ------------------
-def conectar(): # Conecta ao banco
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            endereco TEXT,
-            usuario TEXT UNIQUE NOT NULL,
-            senha_hash TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    return conn
-
-def hash_senha(senha: str): # Criptografa a senha usando SHA256 
-    return hashlib.sha256(senha.encode("utf-8")).hexdigest() # Retorna a senha criptografada em hexadecimal
+# Schema, hash das senhas e sessões ficam no autenticacao.py
 
 def validar_email(email): # Valida o email usando regex 
     return re.match(r"^[\w\.-]+@[\w\.-]+\.\w+$", email) # Retorna True se o email for válido 
@@ -44,19 +38,16 @@ def cadastrar_usuario(): # Cria a janela de cadastro do usuário
             messagebox.showerror("Erro", "Email inválido!")
             return
 
-        senha_hash = hash_senha(senha) # Criptografa a senha usando SHA256
-        conn = conectar() # Conecta ao banco 
-        c = conn.cursor()
+        senha_hash = autenticacao.gerar_hash(senha) # scrypt com sal (ver autenticacao.py)
+        conn = autenticacao.conectar() # Conecta ao banco 
         try: #
-            c.execute("INSERT INTO usuarios (nome, email, endereco, usuario, senha_hash) VALUES (?, ?, ?, ?, ?)",
-                      (nome, email, endereco, usuario, senha_hash)) # Insere o usuário no banco de dados
-            conn.commit()
+            with conn: # Commit no sucesso, rollback no erro
+                conn.execute("INSERT INTO usuarios (nome, email, endereco, usuario, senha_hash) VALUES (?, ?, ?, ?, ?)",
+                             (nome, email, endereco, usuario, senha_hash)) # Insere o usuário no banco de dados
             messagebox.showinfo("Sucesso", "Usuário cadastrado com sucesso!")
             janela_cadastro.destroy()
         except sqlite3.IntegrityError: # Se o usuário ou email ja existir 
             messagebox.showerror("Erro", "Usuário ou email já cadastrado!") # Exibe uma mensagem de erro
-        finally:
-            conn.close()
 
     janela_cadastro = ctk.CTkToplevel(app) # Cria a janela de cadastro do usuário 
     janela_cadastro.title("Cadastro de Novo Usuário") 
@@ -84,53 +75,81 @@ def login(): # Função de login do usuário e abre o main.py em uma nova janela
         messagebox.showwarning("Aviso", "Preencha usuário e senha!")
         return
 
-    senha_hash = hash_senha(senha_text)
-    conn = conectar()
-    c = conn.cursor()
-    c.execute("SELECT nome FROM usuarios WHERE usuario=? AND senha_hash=?", (usuario_text, senha_hash))
-    row = c.fetchone()
-    conn.close()
-
-    if row: # Se o login for bem-sucedido 
-        nome_usuario = row[0]
-        token = secrets.token_hex(16)  # token de 32 caracteres
+    usuario = autenticacao.autenticar(usuario_text, senha_text) # Hash antigo é refeito aqui
+    if not usuario:
+        messagebox.showerror("Erro", "Usuário ou senha incorretos!")
+        return
+    usuario_id, nome_usuario = usuario
+    token = autenticacao.criar_sessao(usuario_id) # Assinado e com validade (o main.py confere)
+    marcar("login validado")
+    if PROCESSO_SEPARADO:
         app.destroy()  # fecha login
-
-        # Definir caminho do main.exe (ou main.py em dev)
-        if getattr(sys, 'frozen', False):
-            possible1 = os.path.join(getattr(sys, "_MEIPASS", ""), "main.exe")
-            possible2 = os.path.join(os.path.dirname(sys.executable), "main.exe")
-            if os.path.exists(possible1):
-                caminho_main = possible1
-            else:
-                caminho_main = possible2
-        else:
-            caminho_main = os.path.join(os.getcwd(), "main.py")
-
-        if os.path.exists(caminho_main):
-            python_exe = sys.executable
-            # Se for exe, podemos abrir diretamente
-            args = [caminho_main, nome_usuario, token]
-            if caminho_main.endswith(".py"):
-                # Se for script Python, usar pythonw.exe para não mostrar console
-                python_exe = python_exe.replace("python.exe", "pythonw.exe")
-                if not os.path.exists(python_exe):
-                    python_exe = sys.executable
-                args = [python_exe, caminho_main, nome_usuario, token]
-
-            subprocess.Popen( # Abre o main.py em uma nova janela
-                args,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.DETACHED_PROCESS
-            )
+        abrir_processo_separado(nome_usuario, token)
+    else:
+        app.after_idle(abrir_gerenciador, nome_usuario, token) # Fora do callback do botão que será destruído
+
+def abrir_gerenciador(nome_usuario, token): # Troca o login pelo ECUManagerApp na mesma janela (sem novo interpretador)
+    frame.destroy()
+    import main # Só depois do login: a tela de login abre sem carregar o gerenciador
+    marcar("import main")
+    main.init_db()
+    marcar("banco de ECUs")
+    gerenciador = main.ECUManagerApp(app, nome_usuario, token)
+    marcar("janela do gerenciador")
+    if MOSTRAR_TEMPOS:
+        _esperar_grid(gerenciador)
+
+def _esperar_grid(gerenciador): # Marca a 1ª página do grid (carregada em segundo plano) e imprime o relatório
+    if gerenciador.grid_task is not None:
+        app.after(10, _esperar_grid, gerenciador)
+        return
+    marcar("1ª página do grid")
+    imprimir_tempos()
+
+def imprimir_tempos(): # Relatório de inicialização: tempo de cada etapa e acumulado
+    print("⏱️  Inicialização:")
+    anterior = 0.0
+    for etapa, segundos in _tempos:
+        print(f"   {etapa:<30} {(segundos - anterior) * 1000:8.1f} ms   (total {segundos * 1000:8.1f} ms)")
+        anterior = segundos
+
+def abrir_processo_separado(nome_usuario, token): # Modo antigo: abre main.exe/main.py em outro processo
+    import subprocess
+    # Definir caminho do main.exe (ou main.py em dev)
+    if getattr(sys, 'frozen', False):
+        possible1 = os.path.join(getattr(sys, "_MEIPASS", ""), "main.exe")
+        possible2 = os.path.join(os.path.dirname(sys.executable), "main.exe")
+        if os.path.exists(possible1):
+            caminho_main = possible1
         else:
-            messagebox.showerror("Erro", "main.exe ou main.py não encontrado!")
+            caminho_main = possible2
     else:
-        messagebox.showerror("Erro", "Usuário ou senha incorretos!")
+        caminho_main = os.path.join(os.getcwd(), "main.py")
+
+    if os.path.exists(caminho_main):
+        python_exe = sys.executable
+        # Se for exe, podemos abrir diretamente
+        args = [caminho_main, nome_usuario, token]
+        if caminho_main.endswith(".py"):
+            # Se for script Python, usar pythonw.exe para não mostrar console
+            python_exe = python_exe.replace("python.exe", "pythonw.exe")
+            if not os.path.exists(python_exe):
+                python_exe = sys.executable
+            args = [python_exe, caminho_main, nome_usuario, token]
+
+        subprocess.Popen( # Abre o main.py em uma nova janela
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, "DETACHED_PROCESS", 0)
+        )
+    else:
+        messagebox.showerror("Erro", "main.exe ou main.py não encontrado!")
 
 # ------------------ INTERFACE ------------------
+autenticacao.conectar() # Cria o schema uma vez na inicialização
+marcar("banco de usuários")
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
@@ -147,4 +166,8 @@ entry_senha = ctk.CTkEntry(frame, placeholder_text="Senha", show="*"); entry_sen
 ctk.CTkButton(frame, text="Entrar", command=login).pack(pady=10)
 ctk.CTkButton(frame, text="Cadastrar novo usuário", command=cadastrar_usuario, fg_color="gray", hover_color="dimgray").pack(pady=10)
 
+marcar("janela de login")
+if MOSTRAR_TEMPOS:
+    app.after_idle(marcar, "1º desenho do login")
+
 app.mainloop()
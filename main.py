@@ -3,97 +3,463 @@ ECU Manager (Tkinter + SQLite + CSV Import)
 Autor: Victor Peixoto
 """
 
-import os, sys, sqlite3, csv, subprocess
+import os, sys, sqlite3, csv, bisect, time, contextlib, threading
+import db, busca, tarefas, metricas, snapshot, autenticacao, sincronizacao, estatisticas
 import customtkinter as ctk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox # filedialog só ao importar/exportar (abertura mais rápida)
 
 DB_FILE = "ecus.db" # Caminho do banco de dados
+SERVER_URL = os.environ.get("ECU_SERVIDOR", "") # Ex.: http://127.0.0.1:8765 — buscas pelo servidor.py
+USE_SNAPSHOT = os.environ.get("ECU_SNAPSHOT", "1") != "0" # Buscas pelo snapshot mapeado (ver snapshot.py)
 TABLE_NAME = "modelos_ecu" # Nome da tabela
 
 # ---------------- DATABASE ----------------
-def get_connection(): # Conecta ao banco
-    return sqlite3.connect(DB_FILE) # Retorna a conexão
-
-def init_db(): # Cria a tabela
-    conn = get_connection() # Conecta ao banco
-    c = conn.cursor()# Cria um cursor
-    c.execute(f"""
+# SQL fixo: o cache de statements da conexão reaproveita o plano preparado
+SQL_INSERT = f"INSERT INTO {TABLE_NAME} (num_bosch, modelo_ecu, fabricante, num_norm, familia) VALUES (?, ?, ?, ?, ?)"
+SQL_UPDATE = f"UPDATE {TABLE_NAME} SET num_bosch=?, modelo_ecu=?, fabricante=?, num_norm=?, familia=? WHERE id=?"
+SQL_DELETE = f"DELETE FROM {TABLE_NAME} WHERE id=?"
+SQL_GET = f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} WHERE id=?"
+SQL_INSERT_IGNORE = SQL_INSERT + " ON CONFLICT DO NOTHING" # Importação em massa
+
+def _create_schema(conn): # Executado uma única vez por processo (ver db.get_connection)
+    conn.execute(f"""
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             num_bosch TEXT NOT NULL,
             modelo_ecu TEXT NOT NULL,
             fabricante TEXT NOT NULL,
+            num_norm TEXT,
+            familia TEXT,
             UNIQUE(num_bosch, modelo_ecu)
         )
     """) # Cria a tabela
-    conn.commit() # Salva as alterações
-    conn.close() # Fecha a conexão
-
+    _migrate_derived(conn)
+    busca.create_search_schema(conn) # Índice FTS + gatilhos
+    snapshot.create_schema(conn) # Contador de versão usado para validar o snapshot
+    sincronizacao.create_schema(conn) # Registro de mudanças para sincronizar cópias do banco
+    estatisticas.create_schema(conn) # Totais por fabricante/família mantidos por gatilhos
+
+# Colunas calculadas em Python ao gravar: coluna -> (coluna de origem, função)
+DERIVED_COLUMNS = {
+    "num_norm": ("num_bosch", busca.normalize_num), # Chave normalizada do número Bosch
+    "familia": ("modelo_ecu", estatisticas.familia), # Família do modelo (MED17, EDC16, ...)
+}
+
+def _derived(num_bosch, modelo_ecu): # Valores das colunas calculadas, na ordem de SQL_INSERT
+    return busca.normalize_num(num_bosch), estatisticas.familia(modelo_ecu)
+
+def _migrate_derived(conn): # Cria e preenche as colunas calculadas em bancos antigos
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    for column, (source, fn) in DERIVED_COLUMNS.items():
+        if column not in columns: # Banco antigo
+            conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {column} TEXT")
+        missing = conn.execute(f"SELECT id, {source} FROM {TABLE_NAME} WHERE {column} IS NULL").fetchall()
+        if missing: # Linhas gravadas por versões antigas ou outras ferramentas
+            with conn:
+                conn.executemany(f"UPDATE {TABLE_NAME} SET {column}=? WHERE id=?",
+                                 [(fn(value), row_id) for row_id, value in missing])
+    try: # O mesmo part number escrito de outro jeito é duplicado
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {TABLE_NAME}_num_norm ON {TABLE_NAME}(num_norm, modelo_ecu)")
+    except sqlite3.IntegrityError: # Banco antigo com duplicados pela chave normalizada: índice comum
+        print("⚠️ Há ECUs repetidas pela chave normalizada; o índice num_norm não será UNIQUE.")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {TABLE_NAME}_num_norm_dup ON {TABLE_NAME}(num_norm, modelo_ecu)")
+
+def get_connection(): # Conexão compartilhada da thread atual (não fechar)
+    return db.get_connection(DB_FILE, _create_schema)
+
+def init_db(): # Cria a tabela (na inicialização)
+    get_connection()
+
+_served = threading.local() # Quem respondeu a última busca desta thread: "servidor", "snapshot" ou None (SQLite)
+
+def _plano_busca(num_bosch_like="", modelo_like="", fabricante_like="", *args, grupo=None, **kwargs):
+    # EXPLAIN QUERY PLAN do filtro (só é chamado para consultas lentas, com as métricas ligadas)
+    source = getattr(_served, "by", None)
+    if source: # O SQLite não executou esta consulta: o plano dele não explicaria a demora
+        return [f"(respondida pelo {source})"]
+    return busca.explain(get_connection(), num_bosch_like, modelo_like, fabricante_like, grupo)
+
+@metricas.medir("insert", linhas=lambda row_id: int(row_id is not None))
 def insert_ecu(num_bosch, modelo_ecu, fabricante): # Insere um ECU
-    conn = get_connection() # Conecta ao banco
-    c = conn.cursor() # Cria um cursor
+    conn = get_connection()
     try: # Tenta inserir
-        c.execute(f"INSERT INTO {TABLE_NAME} (num_bosch, modelo_ecu, fabricante) VALUES (?, ?, ?)",
-                  (num_bosch.strip(), modelo_ecu.strip(), fabricante.strip())) # Insere o ECU
-        conn.commit() # Salva as alterações
-        rowid = c.lastrowid # Retorna o ID do ECU
+        with conn: # Commit no sucesso, rollback no erro
+            c = conn.execute(SQL_INSERT, (num_bosch.strip(), modelo_ecu.strip(), fabricante.strip(),
+                                          *_derived(num_bosch, modelo_ecu))) # Insere o ECU
+        busca.bump_generation() # Invalida o cache de buscas
+        return c.lastrowid # Retorna o ID do ECU
     except sqlite3.IntegrityError: # Se o ECU ja existir
-        rowid = None # Retorna None
-    finally: # Fecha a conexão
-        conn.close()
-    return rowid # Retorna o ID do ECU
+        return None # Retorna None
 
+@metricas.medir("update", linhas=int)
 def update_ecu(row_id, num_bosch, modelo_ecu, fabricante): # Atualiza um ECU
     conn = get_connection()
-    c = conn.cursor()
     try: # Tenta atualizar
-        c.execute(f"UPDATE {TABLE_NAME} SET num_bosch=?, modelo_ecu=?, fabricante=? WHERE id=?",
-                  (num_bosch.strip(), modelo_ecu.strip(), fabricante.strip(), row_id)) # Atualiza o ECU
-        conn.commit()
+        with conn:
+            c = conn.execute(SQL_UPDATE, (num_bosch.strip(), modelo_ecu.strip(), fabricante.strip(),
+                                          *_derived(num_bosch, modelo_ecu), row_id)) # Atualiza o ECU
+        busca.bump_generation()
         return c.rowcount > 0 # Retorna True se o ECU foi atualizado
     except Exception as e: # Se ocorrer um erro
+        if db.is_busy(e): # Banco ocupado: quem chamou decide (a janela avisa o usuário)
+            raise
         print("❌ Erro ao atualizar ECU:", e) # Imprime o erro
         return False
-    finally:
-        conn.close()
 
+@metricas.medir("delete", linhas=int)
 def delete_ecu(row_id): # Exclui um ECU
     conn = get_connection()
-    c = conn.cursor()
-    c.execute(f"DELETE FROM {TABLE_NAME} WHERE id=?", (row_id,)) # Exclui o ECU
-    conn.commit()
-    ok = c.rowcount > 0 # Retorna True se o ECU foi excluido
-    conn.close()
-    return ok
+    with conn:
+        c = conn.execute(SQL_DELETE, (row_id,)) # Exclui o ECU
+    busca.bump_generation()
+    return c.rowcount > 0 # Retorna True se o ECU foi excluido
+
+_remote = None # servidor.Cliente (criado na 1ª busca quando SERVER_URL está definido)
+SERVER_RETRY_S = 30 # Servidor fora do ar: buscas vão direto ao banco local por esse tempo antes de tentar de novo
+_remote_down_until = None # time.monotonic() até quando o servidor é dado como fora do ar (None = no ar)
+
+def _remote_call(name, *args, **kwargs): # Consulta pelo servidor; None = usar o banco local
+    global _remote, _remote_down_until
+    if not SERVER_URL:
+        return None
+    if _remote_down_until is not None and time.monotonic() < _remote_down_until: # Sem esperar o timeout a cada tecla
+        return None
+    if _remote is None:
+        import servidor
+        _remote = servidor.Cliente(SERVER_URL)
+    try:
+        result = getattr(_remote, name)(*args, **kwargs)
+        _served.by = "servidor"
+    except OSError as e: # Servidor fora do ar: segue pelo arquivo local
+        if _remote_down_until is None: # Um aviso por queda
+            print(f"⚠️ Servidor indisponível, usando o banco local (nova tentativa a cada {SERVER_RETRY_S}s):", e)
+        _remote_down_until = time.monotonic() + SERVER_RETRY_S
+        return None
+    if _remote_down_until is not None:
+        print("✅ Servidor de volta:", SERVER_URL)
+        _remote_down_until = None
+    return result
+
+def _snapshot_call(name, *args, **kwargs): # Consulta pelo snapshot; None = ausente, desatualizado ou filtro do SQLite
+    if not USE_SNAPSHOT:
+        return None
+    task = tarefas.current() # Filtro novo (tecla seguinte) cancela a consulta, como task.watch no SQLite
+    result = snapshot.consultar(DB_FILE, get_connection(), name, *args, verificar=task.check if task else None, **kwargs)
+    if result is not None:
+        _served.by = "snapshot"
+    return result
+
+@metricas.medir("search", linhas=len, plano=_plano_busca)
+def search_ecus(num_bosch_like="", modelo_like="", fabricante_like="", grupo=None): # Busca ECUs (plano em busca.py)
+    # grupo (fabricante, família exatos, ver busca.build_where) só existe no banco local
+    _served.by = None
+    rows = None if grupo else _remote_call("search", num_bosch_like, modelo_like, fabricante_like)
+    if rows is None and not grupo:
+        rows = _snapshot_call("search", num_bosch_like, modelo_like, fabricante_like)
+    if rows is not None:
+        return rows
+    return busca.search(get_connection(), num_bosch_like, modelo_like, fabricante_like, grupo) # Retorna os ECUs
+
+def get_ecu(row_id): # Uma linha pelo id (None se não existir)
+    return get_connection().execute(SQL_GET, (row_id,)).fetchone()
+
+@metricas.medir("count", linhas=lambda total: total, plano=_plano_busca)
+def count_ecus(num_bosch_like="", modelo_like="", fabricante_like="", grupo=None): # Conta ECUs do filtro
+    _served.by = None
+    total = None if grupo else _remote_call("count", num_bosch_like, modelo_like, fabricante_like)
+    if total is None and not grupo:
+        total = _snapshot_call("count", num_bosch_like, modelo_like, fabricante_like)
+    if total is not None:
+        return total
+    return busca.count(get_connection(), num_bosch_like, modelo_like, fabricante_like, grupo)
+
+@metricas.medir("page", linhas=len, plano=_plano_busca)
+def page_ecus(num_bosch_like="", modelo_like="", fabricante_like="", after_id=0, limit=200, before_id=None,
+              grupo=None):
+    # Uma página do filtro, a partir de after_id (ou antes de before_id)
+    _served.by = None
+    rows = None if grupo else _remote_call("page", num_bosch_like, modelo_like, fabricante_like,
+                                           after_id=after_id, limit=limit, before_id=before_id)
+    if rows is None and not grupo:
+        rows = _snapshot_call("page", num_bosch_like, modelo_like, fabricante_like,
+                              after_id=after_id, limit=limit, before_id=before_id)
+    if rows is not None:
+        return rows
+    return busca.page(get_connection(), num_bosch_like, modelo_like, fabricante_like,
+                      after_id=after_id, limit=limit, before_id=before_id, grupo=grupo)
+
+def similar_ecus(num_bosch, limit=10): # Números parecidos, do mais próximo ao mais distante (ver busca.similar)
+    return busca.similar(get_connection(), num_bosch, limit)
+
+def ecu_stats(top=estatisticas.TOP_N, fabricante=None): # (totais, top fabricantes, top famílias) pelo resumo
+    conn = get_connection()
+    return (estatisticas.totais(conn), estatisticas.top_fabricantes(conn, top),
+            estatisticas.top_familias(conn, top, fabricante))
+
+@metricas.medir("lookup", linhas=len)
+def lookup_ecus(numbers): # Vários números Bosch numa consulta só (ver busca.lookup)
+    rows = _remote_call("lookup", [n.strip() for n in numbers])
+    if rows is not None:
+        return rows
+    return busca.lookup(get_connection(), [n.strip() for n in numbers])
+
+# ---------------- IMPORTAÇÃO EM MASSA ----------------
+IMPORT_CHUNK_SIZE = 500 # Linhas por lote (2 parâmetros por linha na checagem de duplicados)
+
+# Nomes de coluna aceitos em cada campo (o primeiro preenchido vence)
+CSV_ALIASES = {
+    "num_bosch": ("num_bosch", "NumeroBosch"),
+    "modelo_ecu": ("modelo_ecu", "Modelo"),
+    "fabricante": ("fabricante", "Fabricante"),
+}
+FABRICANTE_PADRAO = "Desconhecido" # Usado quando o CSV não traz fabricante
+
+class ImportReport: # Resultado de uma importação em massa
+    def __init__(self):
+        self.imported = 0 # Linhas gravadas
+        self.duplicates = [] # Números de linha já existentes no banco (ou repetidas no arquivo)
+        self.invalid = [] # Números de linha sem num_bosch ou modelo_ecu
+
+    def __repr__(self):
+        return (f"ImportReport(imported={self.imported}, duplicates={len(self.duplicates)}, "
+                f"invalid={len(self.invalid)})")
+
+    def summary(self): # Texto para o usuário
+        return (f"Importados: {self.imported}\n"
+                f"Duplicados ignorados: {len(self.duplicates)}\n"
+                f"Inválidos: {len(self.invalid)}")
+
+def _pick(row, field): # Lê um campo do CSV aceitando os apelidos
+    for name in CSV_ALIASES[field]:
+        value = row.get(name)
+        if value and value.strip():
+            return value.strip()
+    return ""
+
+def _csv_records(f): # (linha, num_bosch, modelo_ecu, fabricante) de um arquivo já aberto
+    reader = csv.DictReader(f, delimiter=",")
+    for row in reader:
+        yield (reader.line_num, _pick(row, "num_bosch"), _pick(row, "modelo_ecu"),
+               _pick(row, "fabricante") or FABRICANTE_PADRAO)
+
+def iter_csv_records(path): # Lê o CSV em streaming: (linha, num_bosch, modelo_ecu, fabricante)
+    with open(path, newline="", encoding="utf-8-sig") as f: # utf-8-sig remove BOM
+        yield from _csv_records(f)
+
+def _existing_keys(c, keys): # Quais chaves (num_norm, modelo_ecu) do lote já estão no banco
+    if not keys:
+        return set()
+    placeholders = ",".join(["(?, ?)"] * len(keys))
+    params = [v for key in keys for v in key]
+    # JOIN com o lote (não "IN (VALUES ...)", que varre o índice inteiro a cada lote)
+    c.execute(f"WITH lote(num_norm, modelo_ecu) AS (VALUES {placeholders}) "
+              f"SELECT m.num_norm, m.modelo_ecu FROM lote "
+              f"JOIN {TABLE_NAME} m ON m.num_norm = lote.num_norm AND m.modelo_ecu = lote.modelo_ecu", params)
+    return set(c.fetchall())
+
+def _import_chunk(c, chunk, report): # Grava um lote dentro da transação aberta
+    batch, keys = [], {}
+    for line, num, model, fabri in chunk:
+        if not num or not model: # Campos obrigatórios
+            report.invalid.append(line)
+            continue
+        key = (busca.normalize_num(num), model) # "0 281 012 345" e "281012345" são a mesma peça
+        if key in keys: # Repetida dentro do próprio lote
+            report.duplicates.append(line)
+            continue
+        keys[key] = line
+        batch.append((line, num, model, fabri, key[0]))
+    existing = _existing_keys(c, list(keys))
+    rows = []
+    for line, num, model, fabri, norm in batch:
+        if (norm, model) in existing:
+            report.duplicates.append(line)
+        else:
+            rows.append((num, model, fabri, norm, estatisticas.familia(model)))
+    c.executemany(SQL_INSERT_IGNORE, rows) # Rede de segurança para outras restrições UNIQUE
+    report.imported += c.rowcount if c.rowcount >= 0 else len(rows)
 
-def search_ecus(num_bosch_like="", modelo_like="", fabricante_like=""): # Busca ECUs
+def import_rows(records, chunk_size=IMPORT_CHUNK_SIZE, task=None, fraction=None):
+    # Importa (linha, num, modelo, fabricante) numa transação; task (tarefas.Task) recebe progresso/cancelamento
+    report = ImportReport()
     conn = get_connection()
     c = conn.cursor()
-    query = f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {TABLE_NAME} WHERE 1=1" # Busca os ECUs
-    params = [] # Lista de parâmetros
-    if num_bosch_like: # Se o num_bosch for diferente de vazio
-        query += " AND num_bosch LIKE ?" # Adiciona o parâmetro
-        params.append(f"%{num_bosch_like}%") # Adiciona o parâmetro
-    if modelo_like:     # Se o modelo_ecu for diferente de vazio
-        query += " AND modelo_ecu LIKE ?" # Adiciona o parâmetro
-        params.append(f"%{modelo_like}%")
-    if fabricante_like:     # Se o fabricante for diferente de vazio
-        query += " AND fabricante LIKE ?"
-        params.append(f"%{fabricante_like}%")
-    query += " ORDER BY id ASC"
-    c.execute(query, params) # Executa a query
-    rows = c.fetchall() # Retorna os ECUs
-    conn.close()
-    return rows
+    done = 0
+    try:
+        c.execute("BEGIN")
+        version = snapshot.data_version(conn) # Snapshot nesta versão pode ser atualizado só com as linhas novas
+        last_id = busca.begin_bulk_insert(conn) # Índice de texto montado no fim, em lote
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _import_chunk(c, chunk, report)
+                done += len(chunk)
+                chunk = []
+                if task:
+                    task.check() # Cancelar desfaz o lote inteiro (rollback abaixo)
+                    task.progress(done, fraction() if fraction else None)
+        if chunk:
+            _import_chunk(c, chunk, report)
+        busca.end_bulk_insert(conn, last_id)
+        sincronizacao.registrar_lote(conn, last_id)
+        estatisticas.registrar_lote(conn, last_id)
+        if report.imported:
+            snapshot.bump_version(conn) # A importação inteira conta como uma mudança
+        version_after = snapshot.data_version(conn)
+        conn.commit() # Um único commit (um fsync) para o arquivo inteiro
+        busca.bump_generation()
+    except BaseException:
+        conn.rollback() # Nada é gravado se o arquivo falhar no meio
+        raise
+    if report.imported and USE_SNAPSHOT:
+        snapshot.apos_importacao(DB_FILE, conn, version, version_after)
+    return report
+
+def import_csv_bulk(path, chunk_size=IMPORT_CHUNK_SIZE, task=None): # Importa um CSV inteiro em lotes
+    size = os.path.getsize(path) or 1
+    with open(path, newline="", encoding="utf-8-sig") as f: # utf-8-sig remove BOM
+        return import_rows(_csv_records(f), chunk_size, task, lambda: f.buffer.tell() / size)
+
+# ---------------- EXPORTAÇÃO ----------------
+EXPORT_COLUMNS = ["num_bosch", "modelo_ecu", "fabricante"]
+EXPORT_FETCH = 5000 # Linhas lidas do cursor por vez (memória constante)
+EXPORT_FORMATS = { # Extensão -> formato
+    ".csv": "csv",
+    ".gz": "csv.gz",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+}
+
+class ExportReport: # Resultado de uma exportação
+    def __init__(self, path, fmt):
+        self.path, self.fmt = path, fmt
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self): # Linhas por segundo
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return f"ExportReport(rows={self.rows}, fmt={self.fmt!r}, seconds={self.seconds:.2f}, rate={self.rate:.0f}/s)"
+
+def _pyarrow(): # pyarrow é opcional (só para Parquet/Arrow)
+    try:
+        import pyarrow, pyarrow.parquet, pyarrow.ipc
+        return pyarrow
+    except ImportError:
+        return None
+
+def export_format(path): # Formato pela extensão do arquivo
+    for ext, fmt in EXPORT_FORMATS.items():
+        if path.lower().endswith(ext):
+            return fmt
+    return "csv"
+
+def _write_csv(f, batches, on_batch): # Escreve em CSV lote a lote
+    writer = csv.writer(f)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(r[1:] for r in rows) # Sem montar lista intermediária
+        on_batch(len(rows))
+
+def _write_arrow(path, fmt, batches, on_batch): # Parquet ou Arrow IPC, um record batch por lote
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("pyarrow não instalado: use CSV ou CSV.gz")
+    schema = pa.schema([(name, pa.string()) for name in EXPORT_COLUMNS])
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema, compression="zstd")
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_file(path, schema)
+        write = writer.write_batch
+    try:
+        for rows in batches:
+            columns = [pa.array([r[i] for r in rows], pa.string()) for i in (1, 2, 3)]
+            write(pa.record_batch(columns, schema=schema))
+            on_batch(len(rows))
+    finally:
+        writer.close()
+
+def export_ecus(path, num="", model="", fabri="", fmt=None, task=None, grupo=None): # Exporta em streaming (filtro opcional)
+    fmt = fmt or export_format(path)
+    report = ExportReport(path, fmt)
+    started = time.perf_counter()
+    total = count_ecus(num, model, fabri, grupo=grupo) if task else 0
+    batches = busca.iterate(get_connection(), num, model, fabri, EXPORT_FETCH, grupo)
+
+    def on_batch(n): # Progresso e cancelamento a cada lote
+        report.rows += n
+        if task:
+            task.check()
+            task.progress(report.rows, report.rows / total if total else None)
+
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            _write_csv(f, batches, on_batch)
+    elif fmt == "csv.gz":
+        import gzip
+        with gzip.open(path, "wt", newline="", encoding="utf-8", compresslevel=6) as f:
+            _write_csv(f, batches, on_batch)
+    else:
+        _write_arrow(path, fmt, batches, on_batch)
+    report.seconds = time.perf_counter() - started
+    return report
 
 # ---------------- GUI ----------------
+PAGE_SIZE = 200 # Linhas buscadas por vez no grid
+SIMILAR_SHOWN = 5 # Números parecidos sugeridos na barra de status quando a busca não acha nada
+WINDOW_PAGES = 3 # Páginas mantidas no Treeview (o resto é descartado e buscado de novo ao rolar)
+SCROLL_MARGIN = 0.1 # Fração da barra perto da borda que dispara a próxima página
+
+DEBOUNCE_MS = 150 # Espera após a última tecla antes de consultar o banco
+GUI_BUSY_TIMEOUT_MS = 2000 # Escrita pela janela desiste antes de db.BUSY_TIMEOUT (a janela não congela)
+
+def _grid_first_page(task, num, model, fabri, grupo=None): # Tarefa curta: total + 1ª página do filtro
+    conn = get_connection()
+    gen = busca.generation(conn) # Geração lida antes da consulta (escrita no meio descarta o resultado)
+    task.watch(conn) # Um filtro novo cancela a consulta em andamento
+    try:
+        result = count_ecus(num, model, fabri, grupo=grupo), page_ecus(num, model, fabri, limit=PAGE_SIZE, grupo=grupo)
+    finally:
+        task.unwatch(conn)
+    busca.cache_put(("grid", num, model, fabri, grupo), result, gen)
+    return result
+
+def _grid_page(task, num, model, fabri, grupo, after_id, before_id): # Tarefa curta: página seguinte/anterior
+    return page_ecus(num, model, fabri, after_id=after_id, limit=PAGE_SIZE, before_id=before_id, grupo=grupo)
+
+def _count_task(task, num, model, fabri, grupo): # Tarefa curta: total do filtro (ex.: antes de exportar)
+    return count_ecus(num, model, fabri, grupo=grupo)
+
+def _similar_task(task, num): # Tarefa curta: sugestões para um número sem resultado
+    return similar_ecus(num, SIMILAR_SHOWN)
+
 class ECUManagerApp:  # Classe da interface gráfica
-    def __init__(self, root, nome_usuario):  # Construtor
+    def __init__(self, root, nome_usuario, token=None):  # Construtor
         self.root = root
+        self.filter = ("", "", "") # Filtro exibido no grid (num, modelo, fabricante)
+        self.group = None # (fabricante, família) exatos escolhidos no painel de estatísticas (ver busca.build_where)
+        self.pages = [] # Quantidade de linhas de cada página no Treeview, em ordem
+        self.at_start = self.at_end = True # Se há linhas do filtro antes/depois da janela
+        self.loading = False # Evita carregar duas páginas na mesma rolagem
+        self.total = 0 # Linhas do filtro atual
+        self.tasks = tarefas.TaskRunner(root) # Banco e arquivos fora da thread do Tk
+        self.grid_task = None # Consulta do grid em andamento (resultados antigos são descartados)
+        self.page_task = None # Página seguinte/anterior em andamento (descartada se o filtro mudar)
+        self.search_after = None # Busca agendada pelo debounce
+        self.grid_started = None # perf_counter do refresh_grid em andamento (métricas)
+        self.metrics_window = None # Painel de depuração (só com ECU_METRICAS=1)
+        self.stats_window = None # Painel de estatísticas (fabricantes/famílias)
+        # Importação em andamento segura o lock de escrita: a janela avisa em vez de esperar db.BUSY_TIMEOUT
+        get_connection().execute(f"PRAGMA busy_timeout={GUI_BUSY_TIMEOUT_MS}")
         self.root.title("Banco de dados de ECUs")
         self.root.geometry("1200x600")  # Tamanho da janela
         self.selected_id = None  # ID do ECU selecionado
         self.nome_usuario = nome_usuario  # Nome do usuário
+        self.token = token # Sessão criada no login (revogada ao sair)
         self._build_ui()  # Cria a interface gráfica
         self.refresh_grid()  # Atualiza a tabela
 
@@ -118,8 +484,12 @@ class ECUManagerApp:  # Classe da interface gráfica
         self.search_model.grid(row=0, column=1, padx=6, pady=6)
         self.search_fabricante = ctk.CTkEntry(search_frame, placeholder_text="Fabricante", width=180)
         self.search_fabricante.grid(row=0, column=2, padx=6, pady=6)
+        for entry in (self.search_bosch, self.search_model, self.search_fabricante):
+            entry.bind("<KeyRelease>", self.on_search_key) # Filtra enquanto digita
         ctk.CTkButton(search_frame, text="Buscar", command=self.on_search, width=100).grid(row=0, column=3, padx=6)
         ctk.CTkButton(search_frame, text="Limpar Busca", command=self.on_clear_search, width=120).grid(row=0, column=4, padx=6)
+        self.count_var = ctk.StringVar(value="") # Total do filtro atual
+        ctk.CTkLabel(search_frame, textvariable=self.count_var).grid(row=0, column=5, padx=6)
 
         # --- Grid ---
         self.tree_frame = ctk.CTkFrame(self.root, fg_color="#2b2b2b", corner_radius=15)  # Cria um frame
@@ -135,8 +505,8 @@ class ECUManagerApp:  # Classe da interface gráfica
             self.tree.heading(col, text=col.replace("_", " ").capitalize(), anchor="center") 
             self.tree.column(col, width=w, anchor="center")
 
-        vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=vsb.set)
+        self.vsb = vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscroll=self._on_tree_scroll) # Carrega páginas conforme a rolagem
         self.tree.grid(row=0, column=0, sticky="nsew")
         vsb.grid(row=0, column=1, sticky="ns")
         self.tree_frame.rowconfigure(0, weight=1)
@@ -163,6 +533,11 @@ class ECUManagerApp:  # Classe da interface gráfica
         ctk.CTkButton(crud_frame, text="Excluir Selecionado", command=self.on_delete_clicked, width=150).grid(row=1, column=2, padx=6, pady=6)
         ctk.CTkButton(crud_frame, text="Exportar CSV", command=self.on_export_csv, width=120).grid(row=1, column=3, padx=6, pady=6)
         ctk.CTkButton(crud_frame, text="Importar CSV", command=self.on_import_csv, width=120).grid(row=1, column=4, padx=6, pady=6)
+        ctk.CTkButton(crud_frame, text="Cancelar Tarefa", command=self.on_cancel_task, width=120).grid(row=1, column=5, padx=6, pady=6)
+        ctk.CTkButton(crud_frame, text="Estatísticas", command=self.on_show_stats, width=100).grid(row=1, column=6, padx=6, pady=6)
+        if metricas.ativo: # Painel p50/p99 (também no F12)
+            ctk.CTkButton(crud_frame, text="Métricas", command=self.on_show_metrics, width=100).grid(row=1, column=7, padx=6, pady=6)
+            self.root.bind("<F12>", self.on_show_metrics)
 
         # Status
         self.status_var = ctk.StringVar(value="Pronto") # Atualiza o status
@@ -172,19 +547,202 @@ class ECUManagerApp:  # Classe da interface gráfica
     def set_status(self, text): # Atualiza o status
         self.status_var.set(text) 
 
-    def refresh_grid(self, num="", model="", fabri=""): # Limpa a tabela
-        for r in self.tree.get_children(): 
-            self.tree.delete(r) #
-        for row in search_ecus(num, model, fabri): # Preenche a tabela
-            self.tree.insert("", "end", iid=row[0], values=(row[1], row[2], row[3])) 
+    def refresh_grid(self, num="", model="", fabri="", group=None): # Reinicia o grid no topo do filtro
+        self.filter = (num, model, fabri)
+        self.group = group
+        self.grid_started = time.perf_counter()
+        if self.grid_task:
+            self.grid_task.cancel() # Interrompe a consulta anterior
+            self.grid_task = None
+        self.page_task = None # Página do filtro anterior é ignorada ao chegar
+        self.loading = False
+        # Com servidor, outro posto pode ter gravado: o índice em memória já é rápido, sem cache local
+        cached = None if SERVER_URL else busca.cache_get(("grid",) + self.filter + (group,), get_connection())
+        if cached: # Filtro recente: responde sem ir ao banco
+            self._show_first_page(cached)
+            return
+        self.grid_task = self.tasks.submit("Grid", _grid_first_page, *self.filter, group,
+                                           on_done=self._on_grid_loaded, on_error=self._on_task_error)
 
-    def on_search(self): # Limpa a busca
-        self.refresh_grid(self.search_bosch.get().strip(), 
-                          self.search_model.get().strip(),
-                          self.search_fabricante.get().strip()) # Limpa a busca
+    def _on_grid_loaded(self, task, result): # Thread do Tk: preenche a 1ª página
+        if task is not self.grid_task: # Filtro mudou enquanto a consulta rodava
+            return
+        self.grid_task = None
+        self._show_first_page(result)
+
+    def _show_first_page(self, result):
+        self.total, rows = result
+        self.tree.delete(*self.tree.get_children())
+        self.pages = [len(rows)] if rows else []
+        self.at_start, self.at_end = True, len(rows) < PAGE_SIZE
+        self._insert_rows(rows)
+        self.tree.yview_moveto(0)
+        self._update_count()
+        num = self.filter[0]
+        if not self.total and num and not any(w in num for w in busca.WILDCARDS): # Provável erro de digitação
+            self.tasks.submit("Parecidos", _similar_task, num,
+                              on_done=lambda task, result: self._show_similar(num, result))
+        if metricas.ativo and self.grid_started is not None: # Latência vista pelo usuário (inclui a fila)
+            metricas.registrar("refresh_grid", (time.perf_counter() - self.grid_started) * 1000,
+                               self.total, detalhe=lambda: repr(self.filter + (self.group,)))
+            self.grid_started = None
+
+    def _show_similar(self, num, result): # Sugestões para um número sem resultado
+        if result and self.filter[0] == num: # Ignora se o filtro já mudou
+            self.set_status("Nenhum resultado. Parecidos: " + ", ".join(row[2] for row in result))
+
+    @contextlib.contextmanager
+    def _writing(self): # Gravação pela janela: banco ocupado (ex.: importação) vira aviso, não exceção no Tk
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if not db.is_busy(e):
+                raise
+            self.set_status("Banco ocupado: gravação não realizada")
+            messagebox.showwarning("Banco ocupado", "Outra operação está gravando no banco (ex.: importação).\n"
+                                                    "Tente de novo quando ela terminar.")
+
+    def _update_count(self):
+        self.count_var.set(f"{self.total} registros")
+
+    def _insert_rows(self, rows, index="end"):
+        for i, row in enumerate(rows):
+            self.tree.insert("", index if index == "end" else index + i, iid=row[0], values=(row[1], row[2], row[3]))
+
+    def _show_next_page(self, task, rows): # Thread do Tk: acrescenta a página após a última linha exibida
+        if task is not self.page_task: # Filtro mudou enquanto a página era buscada
+            return
+        self.page_task = None
+        self.loading = False
+        items = self.tree.get_children()
+        if items and int(items[-1]) != task.anchor: # Grid mudou no meio (ex.: exclusão): a próxima rolagem busca de novo
+            return
+        self.at_end = len(rows) < PAGE_SIZE
+        if not rows:
+            return
+        first, last = self.tree.yview()
+        self._insert_rows(rows)
+        self.pages.append(len(rows))
+        if len(self.pages) > WINDOW_PAGES: # Descarta a página do topo
+            dropped = self.pages.pop(0)
+            top = first * len(items) - dropped # Mantém a mesma linha visível no topo
+            self.tree.delete(*self.tree.get_children()[:dropped])
+            self.at_start = False
+            self.tree.yview_moveto(max(top, 0) / len(self.tree.get_children()))
+
+    def _show_previous_page(self, task, rows): # Thread do Tk: insere a página antes da primeira linha exibida
+        if task is not self.page_task:
+            return
+        self.page_task = None
+        self.loading = False
+        items = self.tree.get_children()
+        if not items or int(items[0]) != task.anchor:
+            return
+        self.at_start = len(rows) < PAGE_SIZE
+        if not rows:
+            return
+        first, last = self.tree.yview()
+        self._insert_rows(rows, 0)
+        self.pages.insert(0, len(rows))
+        if len(self.pages) > WINDOW_PAGES: # Descarta a página do fim
+            dropped = self.pages.pop()
+            self.tree.delete(*self.tree.get_children()[-dropped:])
+            self.at_end = False
+        self.tree.yview_moveto((first * len(items) + len(rows)) / len(self.tree.get_children()))
+
+    def _on_page_error(self, task, error):
+        if task is self.page_task:
+            self.page_task = None
+            self.loading = False
+        self._on_task_error(task, error)
+
+    def _on_tree_scroll(self, first, last): # yscrollcommand do Treeview
+        self.vsb.set(first, last)
+        if self.loading:
+            return
+        first, last = float(first), float(last)
+        items = self.tree.get_children()
+        if last >= 1 - SCROLL_MARGIN and not self.at_end:
+            anchor = int(items[-1]) if items else 0
+            after_id, before_id, on_done = anchor, None, self._show_next_page
+        elif first <= SCROLL_MARGIN and not self.at_start and items:
+            anchor = int(items[0])
+            after_id, before_id, on_done = 0, anchor, self._show_previous_page
+        else:
+            return
+        self.loading = True # Até a página chegar (a consulta roda fora da thread do Tk)
+        self.page_task = self.tasks.submit("Página", _grid_page, *self.filter, self.group, after_id, before_id,
+                                           on_done=on_done, on_error=self._on_page_error)
+        self.page_task.anchor = anchor # A página só entra se esta linha ainda estiver na borda do grid
+
+    def apply_row_change(self, row_id, matched_before): # Atualiza só o item afetado (O(1) no banco)
+        row = get_ecu(row_id)
+        matched = row is not None and self._matches(row)
+        iid = str(row_id)
+        if self.tree.exists(iid):
+            if matched:
+                self.tree.item(iid, values=(row[1], row[2], row[3]))
+            else:
+                self._resize_page(self.tree.index(iid), -1)
+                self.tree.delete(iid)
+        elif matched and self._in_window(row_id):
+            position = self._position(row_id)
+            self.tree.insert("", position, iid=row_id, values=(row[1], row[2], row[3]))
+            self._resize_page(position, +1)
+        self.total += int(matched) - int(matched_before)
+        self._update_count()
+
+    def _matches(self, row): # A linha entra no filtro exibido (campos de busca + grupo do painel)?
+        return busca.matches(row, *self.filter) and estatisticas.no_grupo(row, self.group)
+
+    def _in_window(self, row_id): # O id cai entre a primeira e a última linha carregadas?
+        items = self.tree.get_children()
+        if not items:
+            return self.at_start and self.at_end
+        return (self.at_start or row_id > int(items[0])) and (self.at_end or row_id < int(items[-1]))
+
+    def _resize_page(self, position, delta): # Mantém self.pages coerente com as linhas do Treeview
+        for i, size in enumerate(self.pages):
+            if position < size or i == len(self.pages) - 1:
+                self.pages[i] += delta
+                return
+            position -= size
+        self.pages.append(delta) # Grid estava vazio
+
+    def _position(self, row_id): # Índice no Treeview que mantém a ordem por id
+        return bisect.bisect_left([int(i) for i in self.tree.get_children()], row_id)
+
+    def _search_terms(self): # Filtro digitado nos três campos
+        return (self.search_bosch.get().strip(),
+                self.search_model.get().strip(),
+                self.search_fabricante.get().strip())
+
+    def on_search(self): # Busca pelo botão
+        self.refresh_grid(*self._search_terms())
         self.set_status("Busca atualizada") 
 
+    def on_search_key(self, event=None): # Busca enquanto digita (com debounce)
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
+        terms = self._search_terms()
+        if terms == self.filter: # Tecla que não muda o texto (mantém também o grupo do painel)
+            return
+        if busca.cache_get(("grid",) + terms + (None,), get_connection()): # Já em cache: responde na hora
+            self.refresh_grid(*terms)
+        else:
+            self.search_after = self.root.after(DEBOUNCE_MS, self._on_search_debounced)
+
+    def _on_search_debounced(self):
+        self.search_after = None
+        terms = self._search_terms()
+        if terms != self.filter:
+            self.refresh_grid(*terms) # Cancela a consulta anterior ainda em andamento
+
     def on_clear_search(self): # Limpa a busca
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
         self.search_bosch.delete(0, "end") 
         self.search_model.delete(0, "end") 
         self.search_fabricante.delete(0, "end")
@@ -207,10 +765,12 @@ class ECUManagerApp:  # Classe da interface gráfica
         if not num or not model or not fabri: # Verifica se todos os campos foram preenchidos
             messagebox.showwarning("Aviso", "Preencha todos os campos.") # Exibe uma mensagem de aviso caso algum campo esteja vazio
             return
-        if insert_ecu(num, model, fabri): # Insere o ECU na tabela
-            self.refresh_grid()
-        else:
-            messagebox.showinfo("Duplicado", "Essa ECU já existe.") 
+        with self._writing():
+            rowid = insert_ecu(num, model, fabri) # Insere o ECU na tabela
+            if rowid:
+                self.apply_row_change(rowid, False)
+            else:
+                messagebox.showinfo("Duplicado", "Essa ECU já existe.") 
 
     def on_save_edit_clicked(self): # Atualiza o ECU
         if not self.selected_id: # Verifica se um ECU foi selecionado
@@ -222,89 +782,208 @@ class ECUManagerApp:  # Classe da interface gráfica
         if not num or not model or not fabri: # Verifica se todos os campos foram preenchidos
             messagebox.showwarning("Aviso", "Preencha todos os campos.")
             return
-        if update_ecu(self.selected_id, num, model, fabri): # Atualiza o ECU  
-            self.refresh_grid()
-        else:
-            messagebox.showerror("Erro", "Falha ao atualizar registro.")
+        before = get_ecu(self.selected_id)
+        with self._writing():
+            if update_ecu(self.selected_id, num, model, fabri): # Atualiza o ECU  
+                self.apply_row_change(self.selected_id, before is not None and self._matches(before))
+            else:
+                messagebox.showerror("Erro", "Falha ao atualizar registro.")
 
     def on_delete_clicked(self): # Exclui o ECU
         if not self.selected_id: # Verifica se um ECU foi selecionado 
             messagebox.showwarning("Selecione", "Selecione um registro.")
             return
         if messagebox.askyesno("Excluir", f"Excluir registro selecionado?"):
-            if delete_ecu(self.selected_id):
-                self.refresh_grid()
-
-    def on_export_csv(self): # Exporta o ECU
-        rows = search_ecus() # Busca os ECUs
-        if not rows: # Verifica se os ECUs foram encontrados
+            before = get_ecu(self.selected_id)
+            with self._writing():
+                if delete_ecu(self.selected_id):
+                    self.apply_row_change(self.selected_id, before is not None and self._matches(before))
+                    self.selected_id = None
+
+    def on_export_csv(self): # Exporta os ECUs em streaming (em segundo plano)
+        terms, group = self.filter, self.group
+        if (any(terms) or group) and not messagebox.askyesno("Exportar", "Exportar apenas os resultados da busca atual?\n"
+                                                              "(Não = exportar o banco inteiro)"):
+            terms, group = ("", "", ""), None
+        self.tasks.submit("Contagem", _count_task, *terms, group, on_error=self._on_task_error,
+                          on_done=lambda task, total: self._choose_export_path(total, terms, group))
+
+    def _choose_export_path(self, total, terms, group): # Thread do Tk, com o total já contado
+        if not total: # Verifica se há ECUs
             messagebox.showinfo("Vazio", "Nenhum registro para exportar.")
             return
-        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV","*.csv")])
+        filetypes = [("CSV", "*.csv"), ("CSV compactado", "*.csv.gz")]
+        if _pyarrow():
+            filetypes += [("Parquet", "*.parquet"), ("Arrow IPC", "*.arrow")]
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=filetypes)
         if not path: # Verifica se o caminho foi selecionado
             return
-        with open(path, "w", newline="", encoding="utf-8") as f: # Abre o arquivo para escrita
-            writer = csv.writer(f)
-            writer.writerow(["num_bosch","modelo_ecu","fabricante"])
-            writer.writerows([(r[1], r[2], r[3]) for r in rows]) # Escreve os ECUs no arquivo
-        messagebox.showinfo("Exportado", f"{len(rows)} registros salvos em {path}")
+        self._submit_long("Exportação", lambda task: export_ecus(path, *terms, task=task, grupo=group), self._on_export_done)
+
+    def _on_export_done(self, task, report):
+        self.set_status(f"Exportação concluída: {report.rows} linhas em {report.seconds:.1f}s "
+                        f"({report.rate:,.0f} linhas/s)".replace(",", "."))
+        messagebox.showinfo("Exportado", f"{report.rows} registros salvos em {report.path}")
 
-    def on_import_csv(self):
+    def on_import_csv(self): # Importa um CSV em massa (em segundo plano, uma transação)
+        from tkinter import filedialog
         path = filedialog.askopenfilename(filetypes=[("CSV files","*.csv")])
         if not path:
             return
-
-        imported, skipped = 0, 0
-        try:
-            with open(path, newline="", encoding="utf-8-sig") as f:  # <-- utf-8-sig remove BOM
-                reader = csv.DictReader(f, delimiter=',')  # <-- garante que o separador é vírgula
-
-                for row in reader:
-                    num = row.get("num_bosch") or row.get("NumeroBosch")
-                    model = row.get("modelo_ecu") or row.get("Modelo")
-                    fabri = row.get("fabricante") or row.get("Fabricante") or "Desconhecido"
-
-                    if num and model:
-                        # Teste: imprime no console
-                        print(num, model, fabri)
-
-                        # Insere no banco
-                        res = insert_ecu(num, model, fabri)
-                        if res:
-                            imported += 1
-                        else:
-                            skipped += 1
-
-            self.refresh_grid()
-            messagebox.showinfo("Importação Concluída", f"Importados: {imported}\nDuplicados ignorados: {skipped}")
-
-        except Exception as e:
-            messagebox.showerror("Erro ao importar", str(e))
-
-
+        self._submit_long("Importação", lambda task: import_csv_bulk(path, task=task), self._on_import_done)
+
+    def _on_import_done(self, task, report):
+        self.refresh_grid(*self.filter, self.group) # Mantém a busca ativa
+        self.set_status(f"Importação: {report.imported} importados, {len(report.duplicates)} duplicados, "
+                        f"{len(report.invalid)} inválidos em {task.elapsed:.1f}s")
+        messagebox.showinfo("Importação Concluída", report.summary())
+
+    # ---------------- TAREFAS ----------------
+    def _submit_long(self, name, fn, on_done, *extra): # Enfileira uma tarefa longa (uma por vez)
+        task = self.tasks.submit(name, fn, long=True, on_done=lambda t, r: on_done(t, r, *extra),
+                                 on_error=self._on_task_error, on_progress=self._on_task_progress,
+                                 on_cancel=self._on_task_cancelled)
+        waiting = self.tasks.waiting
+        self.set_status(f"{name} na fila ({waiting} antes)" if waiting else f"{name} iniciada")
+        return task
+
+    def _on_task_progress(self, task, done, fraction, rate):
+        self.set_status(tarefas.format_progress(task, done, fraction, rate, self.tasks.waiting))
+
+    def _on_task_error(self, task, error):
+        self.set_status(f"{task.name}: erro")
+        messagebox.showerror(f"Erro: {task.name}", str(error))
+
+    def _on_task_cancelled(self, task):
+        self.set_status(f"{task.name} cancelada")
+
+    def on_cancel_task(self): # Cancela a tarefa longa em execução
+        task = self.tasks.cancel_current()
+        self.set_status(f"Cancelando {task.name}..." if task else "Nenhuma tarefa em execução")
+
+    def on_show_metrics(self, event=None): # Painel de depuração: p50/p99 por operação, atualizado a cada 1 s
+        if self.metrics_window is not None and self.metrics_window.winfo_exists():
+            self.metrics_window.lift()
+            return
+        self.metrics_window = ctk.CTkToplevel(self.root)
+        self.metrics_window.title("Métricas")
+        self.metrics_window.geometry("560x260")
+        text = ctk.CTkTextbox(self.metrics_window, font=("Courier New", 12))
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        ctk.CTkLabel(self.metrics_window, text=f"Consultas acima de {metricas.LIMITE_LENTO_MS:g} ms: {metricas.ARQUIVO_LOG}"
+                     ).pack(pady=(0, 10))
+
+        def update():
+            if not self.metrics_window.winfo_exists():
+                return
+            text.delete("1.0", "end")
+            text.insert("1.0", metricas.texto_resumo())
+            self.metrics_window.after(1000, update)
+        update()
+
+    def on_show_stats(self, event=None): # Totais por fabricante e família (tabela de resumo, atualizado a cada 2 s)
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        window = self.stats_window = ctk.CTkToplevel(self.root)
+        window.title("Estatísticas")
+        window.geometry("720x480")
+        totals_var = ctk.StringVar()
+        ctk.CTkLabel(window, textvariable=totals_var, font=("Arial", 14, "bold")).pack(pady=(10, 0))
+        frame = ctk.CTkFrame(window)
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        trees = {}
+        for col, (kind, title) in enumerate((("fabricante", "Fabricante"), ("familia", "Família"))):
+            tree = ttk.Treeview(frame, columns=(kind, "total"), show="headings", selectmode="browse")
+            tree.heading(kind, text=title)
+            tree.heading("total", text="ECUs")
+            tree.column("total", width=90, anchor="e")
+            tree.grid(row=0, column=col, sticky="nsew", padx=5)
+            tree.bind("<Double-1>", lambda event, k=kind: self._stats_drill_down(trees, k))
+            frame.columnconfigure(col, weight=1)
+            trees[kind] = tree
+        frame.rowconfigure(0, weight=1)
+        ctk.CTkLabel(window, text=f"Top {estatisticas.TOP_N} · clique num fabricante para ver as famílias dele · "
+                                  f"duplo clique filtra o grid").pack(pady=(0, 10))
+
+        def fill(tree, rows, keep):
+            tree.delete(*tree.get_children())
+            for name, total in rows:
+                item = tree.insert("", "end", values=(name, total))
+                if name == keep: # Mantém a seleção entre atualizações
+                    tree.selection_set(item)
+
+        def update(event=None):
+            if not window.winfo_exists():
+                return
+            fabricante = self._selected_value(trees["fabricante"])
+            (total, fabricantes, familias), top_fabricantes, top_familias = ecu_stats(fabricante=fabricante)
+            totals_var.set(f"{total} ECUs · {fabricantes} fabricantes · {familias} famílias")
+            fill(trees["familia"], top_familias, self._selected_value(trees["familia"]))
+            if event is None: # Seleção do usuário não recarrega a própria lista
+                fill(trees["fabricante"], top_fabricantes, fabricante)
+                window.after(2000, update)
+        trees["fabricante"].bind("<<TreeviewSelect>>", update)
+        update()
+
+    @staticmethod
+    def _selected_value(tree): # 1ª coluna da linha selecionada (ou None)
+        sel = tree.selection()
+        return str(tree.item(sel[0], "values")[0]) if sel else None
+
+    def _stats_drill_down(self, trees, kind): # Duplo clique no painel: grid com exatamente as linhas contadas
+        fabricante = self._selected_value(trees["fabricante"])
+        familia = self._selected_value(trees["familia"]) if kind == "familia" else None
+        if kind == "familia" and familia is None:
+            return
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
+        for entry in (self.search_bosch, self.search_model, self.search_fabricante):
+            entry.delete(0, "end") # O grupo é exato (não é uma substring dos campos de busca)
+        self.refresh_grid(group=(fabricante, familia))
+        label = " · ".join(f"{title} {value or '(vazio)'}" for title, value in
+                           (("fabricante", fabricante), ("família", familia)) if value is not None)
+        self.set_status(f"Estatísticas: {label} (Limpar Busca volta ao catálogo inteiro)")
 
     def on_edit_clicked(self, event=None): 
         self.on_tree_select(event) 
 
     def logout(self):
+        if self.token:
+            autenticacao.encerrar_sessao(self.token)
+        self.tasks.shutdown()
         self.root.destroy()
 
 # ---------------- MAIN ----------------
+def import_cli(paths): # Importação sem interface: python main.py --importar arquivo.csv [...]
+    init_db()
+    for path in paths:
+        report = import_csv_bulk(path)
+        print(f"📥 {path}: {report!r}")
+        if report.invalid:
+            print("   Linhas inválidas:", ", ".join(map(str, report.invalid[:50])),
+                  "..." if len(report.invalid) > 50 else "")
+
 def main(): # Função principal
+    if len(sys.argv) >= 3 and sys.argv[1] == "--importar": # Modo headless (sem janela)
+        import_cli(sys.argv[2:])
+        return
     if len(sys.argv) < 3: # Verifica se os argumentos foram fornecidos
         print("❌ Acesso negado: execute via login.exe")
         sys.exit() # Encerra o programa
-    nome_usuario = sys.argv[1] 
-    token = sys.argv[2] # Verifica se o token foi fornecido
-    if len(token) != 32: # Verifica se o token foi fornecido com 32 caracteres 
-        print("❌ Token inválido!")
+    token = sys.argv[2]
+    nome_usuario = autenticacao.verificar_sessao(token) # Assinatura + validade + revogação
+    if nome_usuario is None or nome_usuario != sys.argv[1]:
+        print("❌ Token inválido ou expirado!")
         sys.exit() # Encerra o programa
 
     init_db() # Inicializa o banco de dados
     ctk.set_appearance_mode("dark") # Define o modo de aparencia
     ctk.set_default_color_theme("blue") # Define o tema de cores
     root = ctk.CTk() # Cria a janela
-    app = ECUManagerApp(root, nome_usuario) # Cria a classe ECUManagerApp
+    app = ECUManagerApp(root, nome_usuario, token) # Cria a classe ECUManagerApp
     root.mainloop() # Inicia a janela
 
 if __name__ == "__main__":  # Verifica se o arquivo foi executado diretamente 
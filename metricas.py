@@ -0,0 +1,125 @@
+"""
+Instrumentação opcional das operações de banco do ECU Manager
+Ligada pela variável de ambiente ECU_METRICAS=1. Guarda um histograma de latência por operação
+(contagem por faixa: memória fixa, custo de um bisect) e grava as consultas lentas, com o
+EXPLAIN QUERY PLAN, num log rotativo.
+
+    ECU_METRICAS=1 ECU_METRICAS_LENTO_MS=30 python main.py usuario <token>
+"""
+
+import os, time, bisect, threading, atexit, functools
+
+ENV_ATIVO = "ECU_METRICAS"
+ARQUIVO_LOG = os.environ.get("ECU_METRICAS_LOG", "ecu_metricas.log")
+LOG_MAX_BYTES = 1_000_000 # Tamanho de cada arquivo antes de girar
+LOG_BACKUPS = 3 # Arquivos antigos mantidos (ecu_metricas.log.1 ... .3)
+LIMITE_LENTO_MS = float(os.environ.get("ECU_METRICAS_LENTO_MS", "50")) # Acima disso vai para o log com o plano
+
+# Faixas do histograma em ms: crescem 20% a cada passo (0,01 ms ... ~2 min). O percentil
+# é o limite superior da faixa, então o erro máximo é de 20%.
+FAIXAS_MS = [0.01 * 1.2 ** i for i in range(90)]
+
+ativo = os.environ.get(ENV_ATIVO, "") not in ("", "0")
+
+_lock = threading.Lock()
+_histogramas = {} # operação -> Histograma
+_log = None # Criado no primeiro uso
+
+class Histograma: # Latências de uma operação
+    def __init__(self):
+        self.contagens = [0] * (len(FAIXAS_MS) + 1)
+        self.n = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+        self.linhas = 0 # Linhas retornadas/afetadas (soma)
+
+    def adicionar(self, ms, linhas):
+        self.contagens[bisect.bisect_left(FAIXAS_MS, ms)] += 1
+        self.n += 1
+        self.soma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.linhas += linhas or 0
+
+    def percentil(self, p): # Limite superior da faixa que contém o percentil p (0-100)
+        if not self.n:
+            return 0.0
+        alvo = self.n * p / 100
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(FAIXAS_MS[i], self.max_ms) if i < len(FAIXAS_MS) else self.max_ms
+        return self.max_ms
+
+def ativar(valor=True): # Liga/desliga em tempo de execução (ex.: benchmark)
+    global ativo
+    ativo = valor
+
+def _logger():
+    global _log
+    if _log is None:
+        import logging # Só quando a primeira consulta lenta é registrada
+        from logging.handlers import RotatingFileHandler
+        _log = logging.getLogger("ecu.metricas")
+        _log.propagate = False
+        _log.setLevel(logging.INFO)
+        handler = RotatingFileHandler(ARQUIVO_LOG, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _log.addHandler(handler)
+    return _log
+
+def registrar(op, ms, linhas=None, plano=None, detalhe=""): # Soma ao histograma; loga se passou do limite
+    # plano() e detalhe (texto ou função que o devolve) só são avaliados para consultas lentas
+    with _lock:
+        histograma = _histogramas.get(op)
+        if histograma is None:
+            histograma = _histogramas[op] = Histograma()
+        histograma.adicionar(ms, linhas)
+    if ms >= LIMITE_LENTO_MS:
+        try:
+            passos = plano() if plano else []
+        except Exception as e: # Conexão interrompida/ocupada: registra sem o plano
+            passos = [f"(plano indisponível: {e})"]
+        if callable(detalhe):
+            detalhe = detalhe()
+        _logger().info("LENTO %s %.1f ms linhas=%s %s%s", op, ms, linhas, detalhe,
+                       "".join(f"\n    {p}" for p in passos))
+
+def medir(op, linhas=None, plano=None): # Decorador: mede a função quando as métricas estão ligadas
+    # linhas(resultado) -> int; plano(*args, **kwargs) -> [passos do EXPLAIN QUERY PLAN], só se for lenta
+    def decorador(fn):
+        @functools.wraps(fn)
+        def medida(*args, **kwargs):
+            if not ativo:
+                return fn(*args, **kwargs)
+            inicio = time.perf_counter()
+            resultado = fn(*args, **kwargs)
+            ms = (time.perf_counter() - inicio) * 1000
+            registrar(op, ms, linhas(resultado) if linhas else None,
+                      (lambda: plano(*args, **kwargs)) if plano else None, lambda: repr(args) if args else "")
+            return resultado
+        return medida
+    return decorador
+
+def resumo(): # {operação: {n, p50_ms, p99_ms, max_ms, media_ms, linhas}}
+    with _lock:
+        return {op: {"n": h.n, "p50_ms": round(h.percentil(50), 2), "p99_ms": round(h.percentil(99), 2),
+                     "max_ms": round(h.max_ms, 2), "media_ms": round(h.soma_ms / h.n, 2) if h.n else 0.0,
+                     "linhas": h.linhas}
+                for op, h in sorted(_histogramas.items())}
+
+def texto_resumo(): # Tabela para o painel de depuração
+    linhas = [f"{'operação':<14}{'n':>8}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}{'linhas':>10}"]
+    for op, r in resumo().items():
+        linhas.append(f"{op:<14}{r['n']:>8}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}{r['linhas']:>10}")
+    return "\n".join(linhas) if len(linhas) > 1 else "Nenhuma operação medida ainda."
+
+def zerar():
+    with _lock:
+        _histogramas.clear()
+
+def gravar_resumo(): # Grava p50/p99 de cada operação no log (ao sair)
+    if ativo and _histogramas:
+        _logger().info("RESUMO\n%s", texto_resumo())
+
+atexit.register(gravar_resumo)
@@ -0,0 +1,259 @@
+"""
+Servidor local de consulta do catálogo de ECUs (asyncio, só biblioteca padrão)
+A tabela modelos_ecu fica na memória: dicionário pela chave normalizada (lookup exato) e lista
+ordenada de chaves (prefixo por bisect). Recarrega sozinho quando o banco muda
+(PRAGMA data_version). HTTP/1.1 com keep-alive; escuta só em 127.0.0.1 por padrão.
+
+Uso:
+    python servidor.py --db ecus.db --porta 8765
+    ECU_SERVIDOR=http://127.0.0.1:8765 python login.py     # o gerenciador busca pelo servidor
+
+Rotas (respostas JSON; linhas como [id, num_bosch, modelo_ecu, fabricante]):
+    GET  /lookup?num=0281012549
+    GET  /search?num=0281&modelo=edc&fabricante=&after_id=0&limit=200   (before_id para voltar)
+    POST /batch   {"nums": ["0281012549", ...]}
+    GET  /status
+"""
+
+import argparse, asyncio, bisect, json, os, sqlite3, sys, threading, time
+import http.client
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+import db, busca
+
+HOST = "127.0.0.1" # Só a máquina local (use --host para expor na rede, por sua conta)
+PORTA = 8765
+RECARGA_S = 1.0 # Intervalo de verificação de mudanças no banco
+CORPO_MAX = 16 * 2**20 # Maior corpo aceito num POST /batch
+TIMEOUT = 5 # Segundos de espera do cliente
+OCIOSO_S = 60 # Conexão keep-alive sem pedidos é fechada depois disso
+
+# ---------------- ÍNDICE ----------------
+class Indice: # Foto imutável da tabela; trocada inteira a cada recarga
+    def __init__(self, linhas, normas, versao=0):
+        self.linhas = linhas # (id, num_bosch, modelo_ecu, fabricante) em ordem de id
+        self.versao = versao
+        self.carregado_em = time.time()
+        self.ids = [r[0] for r in linhas]
+        self.por_num = {} # num_norm -> [linhas] (mais de um modelo por número)
+        for r, norm in zip(linhas, normas):
+            self.por_num.setdefault(norm, []).append(r)
+        self.ordem = sorted(range(len(linhas)), key=normas.__getitem__) # Posições ordenadas por num_norm
+        self.chaves = [normas[i] for i in self.ordem]
+        self.minusculas = [((r[2] or "").lower(), (r[3] or "").lower()) for r in linhas]
+
+    def _posicoes(self, num): # Posições (em ordem de id) que atendem o filtro do número
+        if not num:
+            return range(len(self.linhas))
+        norm = busca.normalize_num(num)
+        if any(w in num for w in busca.WILDCARDS) or not norm: # Varredura, mesma semântica do banco
+            return [i for i, r in enumerate(self.linhas) if busca.matches(r, num)]
+        inicio = bisect.bisect_left(self.chaves, norm)
+        fim = bisect.bisect_left(self.chaves, busca._prefix_upper(norm))
+        return sorted(self.ordem[inicio:fim])
+
+    def buscar(self, num="", modelo="", fabricante="", after_id=0, limit=None, before_id=None):
+        # (total do filtro, linhas da página) — mesmo contrato de busca.count + busca.page
+        posicoes = self._posicoes(num)
+        modelo, fabricante = modelo.lower(), fabricante.lower()
+        if modelo or fabricante:
+            posicoes = [i for i in posicoes if modelo in self.minusculas[i][0] and fabricante in self.minusculas[i][1]]
+        total = len(posicoes)
+        if before_id is not None:
+            fim = bisect.bisect_left(posicoes, before_id, key=self.ids.__getitem__)
+            inicio = 0 if limit is None else max(fim - limit, 0)
+        else:
+            inicio = bisect.bisect_right(posicoes, after_id, key=self.ids.__getitem__)
+            fim = len(posicoes) if limit is None else inicio + limit
+        return total, [self.linhas[i] for i in posicoes[inicio:fim]]
+
+    def lookup(self, nums): # Mesmo formato de busca.lookup: (posição, número, id, num, modelo, fabricante)
+        resultado = []
+        for pos, num in enumerate(nums):
+            ecus = self.por_num.get(busca.normalize_num(num))
+            if ecus:
+                resultado += [(pos, num) + tuple(r) for r in ecus]
+            else:
+                resultado.append((pos, num, None, None, None, None))
+        return resultado
+
+def carregar(caminho): # Lê a tabela inteira para um Indice
+    conn = db.get_connection(caminho)
+    # Banco anterior à coluna num_norm (ainda não aberto pelo gerenciador): a chave é calculada aqui,
+    # sem migrar o arquivo (o servidor só lê)
+    colunas = [row[1] for row in conn.execute(f"PRAGMA table_info({busca.TABLE_NAME})")]
+    norma = "num_norm" if "num_norm" in colunas else "NULL"
+    linhas, normas = [], []
+    for row_id, num, modelo, fabricante, norm in conn.execute(
+            f"SELECT id, num_bosch, modelo_ecu, fabricante, {norma} FROM {busca.TABLE_NAME} ORDER BY id"):
+        linhas.append((row_id, num, modelo, fabricante))
+        normas.append(norm if norm is not None else busca.normalize_num(num))
+    return Indice(linhas, normas)
+
+# ---------------- SERVIDOR ----------------
+class ServidorECU:
+    def __init__(self, caminho_db):
+        if not os.path.exists(caminho_db):
+            raise FileNotFoundError(caminho_db)
+        self.caminho_db = caminho_db
+        self.indice = carregar(caminho_db)
+        self.recargas = 0
+        self._versao_db = self._data_version()
+
+    def _data_version(self): # Muda quando outra conexão grava no arquivo
+        return db.get_connection(self.caminho_db).execute("PRAGMA data_version").fetchone()[0]
+
+    async def vigiar(self): # Recarrega o índice quando o banco muda (sem parar de atender)
+        while True:
+            await asyncio.sleep(RECARGA_S)
+            versao = self._data_version()
+            if versao == self._versao_db:
+                continue
+            self._versao_db = versao
+            inicio = time.perf_counter()
+            novo = await asyncio.to_thread(carregar, self.caminho_db)
+            self.recargas += 1
+            novo.versao = self.recargas
+            self.indice = novo # Troca atômica: pedidos em andamento terminam com o índice antigo
+            print(f"🔄 Índice recarregado: {len(novo.linhas)} linhas em {time.perf_counter() - inicio:.2f}s",
+                  flush=True)
+
+    def rotear(self, metodo, alvo, corpo): # (status, dados) de um pedido
+        partes = urlsplit(alvo)
+        q = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        indice = self.indice
+        try:
+            if metodo == "GET" and partes.path == "/lookup":
+                num = busca.normalize_num(q.get("num", ""))
+                return "200 OK", {"versao": indice.versao, "ecus": indice.por_num.get(num, [])}
+            if metodo == "GET" and partes.path == "/search":
+                limit = int(q["limit"]) if "limit" in q else None
+                before_id = int(q["before_id"]) if "before_id" in q else None
+                total, linhas = indice.buscar(q.get("num", ""), q.get("modelo", ""), q.get("fabricante", ""),
+                                              int(q.get("after_id", 0)), limit, before_id)
+                return "200 OK", {"versao": indice.versao, "total": total, "ecus": linhas}
+            if metodo == "POST" and partes.path == "/batch":
+                nums = json.loads(corpo or b"{}").get("nums", [])
+                return "200 OK", {"versao": indice.versao, "linhas": indice.lookup(nums)}
+            if metodo == "GET" and partes.path == "/status":
+                return "200 OK", {"versao": indice.versao, "linhas": len(indice.linhas), "recargas": self.recargas,
+                                  "carregado_em": indice.carregado_em, "banco": self.caminho_db}
+        except (ValueError, TypeError, AttributeError) as e: # Parâmetro ou JSON inválido
+            return "400 Bad Request", {"erro": str(e)}
+        return "404 Not Found", {"erro": f"rota desconhecida: {metodo} {partes.path}"}
+
+    async def atender(self, reader, writer): # Uma conexão; vários pedidos enquanto houver keep-alive
+        try:
+            while True:
+                linha = await asyncio.wait_for(reader.readline(), OCIOSO_S)
+                if not linha:
+                    break
+                metodo, alvo, versao_http = linha.decode("latin-1").split()
+                cabecalhos = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    nome, _, valor = h.decode("latin-1").partition(":")
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                tamanho = int(cabecalhos.get("content-length") or 0)
+                if tamanho > CORPO_MAX:
+                    status, dados, manter = "413 Payload Too Large", {"erro": "corpo grande demais"}, False
+                else:
+                    corpo = await reader.readexactly(tamanho) if tamanho else b""
+                    status, dados = self.rotear(metodo, alvo, corpo)
+                    manter = versao_http == "HTTP/1.1" and cabecalhos.get("connection", "").lower() != "close"
+                payload = json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if manter else 'close'}"
+                             f"\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if not manter:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError): # Cliente sumiu, ficou ocioso ou pedido malformado
+            pass
+        finally:
+            writer.close()
+
+    async def executar(self, host=HOST, porta=PORTA, pronto=None): # pronto: callback(servidor asyncio) ao escutar
+        servidor = await asyncio.start_server(self.atender, host, porta)
+        vigia = asyncio.create_task(self.vigiar())
+        if pronto:
+            pronto(servidor)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            vigia.cancel()
+
+# ---------------- CLIENTE ----------------
+class Cliente: # Usado pelo main.py quando ECU_SERVIDOR está definido; uma conexão keep-alive por thread
+    def __init__(self, url, timeout=TIMEOUT):
+        partes = urlsplit(url)
+        self.host, self.porta = partes.hostname or HOST, partes.port or PORTA
+        self.timeout = timeout
+        self.versao = None # Versão do índice vista por último
+        self._local = threading.local()
+
+    def _pedir(self, metodo, caminho, corpo=None):
+        for tentativa in range(2): # O servidor pode ter fechado a conexão ociosa: reconecta uma vez
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+            try:
+                conn.request(metodo, caminho, body=corpo, headers={"Content-Type": "application/json"} if corpo else {})
+                resposta = conn.getresponse()
+                dados = json.loads(resposta.read())
+                break
+            except (http.client.HTTPException, ConnectionError) as e:
+                conn.close()
+                self._local.conn = None
+                if tentativa:
+                    raise ConnectionError(f"servidor {self.host}:{self.porta}: {e}") from e
+        if resposta.status != 200:
+            raise OSError(dados.get("erro", resposta.reason))
+        if self.versao is not None and dados["versao"] != self.versao:
+            busca.bump_generation() # Índice recarregado: resultados em cache ficaram velhos
+        self.versao = dados["versao"]
+        return dados
+
+    def _buscar(self, num, modelo, fabricante, **extra):
+        parametros = {"num": num, "modelo": modelo, "fabricante": fabricante}
+        parametros.update({k: v for k, v in extra.items() if v is not None})
+        dados = self._pedir("GET", "/search?" + urlencode(parametros))
+        return dados["total"], [tuple(r) for r in dados["ecus"]]
+
+    def search(self, num_bosch="", modelo="", fabricante=""):
+        return self._buscar(num_bosch, modelo, fabricante)[1]
+
+    def count(self, num_bosch="", modelo="", fabricante=""):
+        return self._buscar(num_bosch, modelo, fabricante, limit=0)[0]
+
+    def page(self, num_bosch="", modelo="", fabricante="", after_id=0, limit=200, before_id=None):
+        return self._buscar(num_bosch, modelo, fabricante, after_id=after_id, limit=limit, before_id=before_id)[1]
+
+    def lookup(self, nums):
+        dados = self._pedir("POST", "/batch", json.dumps({"nums": list(nums)}).encode("utf-8"))
+        return [tuple(r) for r in dados["linhas"]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local de consulta do catálogo de ECUs.")
+    parser.add_argument("--db", default="ecus.db")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--porta", type=int, default=PORTA)
+    args = parser.parse_args(argv)
+    try:
+        inicio = time.perf_counter()
+        servidor = ServidorECU(args.db)
+    except (OSError, sqlite3.Error) as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"📚 {len(servidor.indice.linhas)} ECUs na memória em {time.perf_counter() - inicio:.2f}s")
+    print(f"🌐 Escutando em http://{args.host}:{args.porta}", flush=True)
+    try:
+        asyncio.run(servidor.executar(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Registro de mudanças e sincronização incremental entre cópias do ecus.db
+Gatilhos gravam cada INSERT/UPDATE/DELETE de modelos_ecu com número de sequência crescente;
+só as mudanças depois da última sequência já recebida viajam entre os bancos.
+
+Conflitos na chave (num_bosch, modelo_ecu) são resolvidos pela última escrita: vence a mudança
+com maior (momento, réplica), e todas as cópias chegam ao mesmo resultado.
+
+Uso:
+    python sincronizacao.py exportar ecus.db delta.jsonl.gz [--desde 120]
+    python sincronizacao.py aplicar delta.jsonl.gz ecus_bancada2.db
+    python sincronizacao.py sincronizar ecus.db ecus_bancada2.db     # nos dois sentidos, só o que falta
+    python sincronizacao.py nova-identidade ecus_copiado.db           # banco copiado de outra bancada
+"""
+
+import argparse, gzip, json, os, sqlite3, sys, tempfile, time, uuid
+
+import db, busca, estatisticas
+
+LOG_TABLE = "modelos_ecu_mudancas" # Uma linha por mudança; seq nunca é reaproveitado (AUTOINCREMENT)
+CONTROL_TABLE = "modelos_ecu_sync_ctl" # Uma linha: réplica e momento gravados pelos gatilhos
+PEERS_TABLE = "sincronizacao_pares" # Última sequência aplicada de cada réplica de origem
+FORMATO = 1 # Versão do arquivo de delta
+AGORA_SQL = "(julianday('now') - 2440587.5) * 86400.0" # Segundos desde 1970 (com fração)
+
+# ---------------- SCHEMA ----------------
+def create_schema(conn): # Executado uma única vez por processo (ver db.get_connection)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LOG_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL, -- I, U ou D
+            ecu_id INTEGER NOT NULL, -- id local da linha
+            num_bosch TEXT, modelo_ecu TEXT, fabricante TEXT, -- valores novos (NULL no D)
+            antigo_num TEXT, antigo_modelo TEXT, -- chave antes da mudança (U e D)
+            momento REAL NOT NULL,
+            origem TEXT NOT NULL -- réplica onde a mudança nasceu
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {LOG_TABLE}_ecu ON {LOG_TABLE}(ecu_id, seq)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {LOG_TABLE}_excluidas ON {LOG_TABLE}(antigo_num, antigo_modelo, seq) "
+                 f"WHERE op = 'D'") # Lápides: um DELETE local mais novo barra a volta da linha
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {CONTROL_TABLE} (replica TEXT NOT NULL, origem TEXT NOT NULL, momento REAL)")
+    if not conn.execute(f"SELECT 1 FROM {CONTROL_TABLE}").fetchone():
+        replica = uuid.uuid4().hex
+        conn.execute(f"INSERT INTO {CONTROL_TABLE} (replica, origem) VALUES (?, ?)", (replica, replica))
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {PEERS_TABLE} (replica TEXT PRIMARY KEY, ultimo_seq INTEGER NOT NULL)")
+
+    origem = f"(SELECT origem FROM {CONTROL_TABLE})"
+    momento = f"(SELECT COALESCE(momento, {AGORA_SQL}) FROM {CONTROL_TABLE})"
+    # Importações em massa suspendem o gatilho de INSERT (mesma flag do FTS); ver registrar_lote
+    em_lote = f"WHEN (SELECT bulk FROM {busca.FTS_CONTROL}) = 0 " if busca.fts_enabled else ""
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {LOG_TABLE}_ai AFTER INSERT ON {busca.TABLE_NAME}
+        {em_lote}BEGIN
+            INSERT INTO {LOG_TABLE} (op, ecu_id, num_bosch, modelo_ecu, fabricante, momento, origem)
+            VALUES ('I', new.id, new.num_bosch, new.modelo_ecu, new.fabricante, {momento}, {origem});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {LOG_TABLE}_au AFTER UPDATE OF num_bosch, modelo_ecu, fabricante
+        ON {busca.TABLE_NAME} BEGIN
+            INSERT INTO {LOG_TABLE} (op, ecu_id, num_bosch, modelo_ecu, fabricante, antigo_num, antigo_modelo,
+                                     momento, origem)
+            VALUES ('U', new.id, new.num_bosch, new.modelo_ecu, new.fabricante, old.num_bosch, old.modelo_ecu,
+                    {momento}, {origem});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {LOG_TABLE}_ad AFTER DELETE ON {busca.TABLE_NAME} BEGIN
+            INSERT INTO {LOG_TABLE} (op, ecu_id, antigo_num, antigo_modelo, momento, origem)
+            VALUES ('D', old.id, old.num_bosch, old.modelo_ecu, {momento}, {origem});
+        END
+    """)
+
+def registrar_lote(conn, last_id): # Fim de importação em massa: registra as linhas novas de uma vez
+    if last_id is None: # Sem FTS o gatilho não é suspenso
+        return
+    conn.execute(f"INSERT INTO {LOG_TABLE} (op, ecu_id, num_bosch, modelo_ecu, fabricante, momento, origem) "
+                 f"SELECT 'I', id, num_bosch, modelo_ecu, fabricante, {AGORA_SQL}, "
+                 f"(SELECT replica FROM {CONTROL_TABLE}) FROM {busca.TABLE_NAME} WHERE id > ? ORDER BY id",
+                 (last_id,))
+
+def replica(conn): # Identidade deste banco
+    return conn.execute(f"SELECT replica FROM {CONTROL_TABLE}").fetchone()[0]
+
+def ultimo_seq(conn):
+    return conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {LOG_TABLE}").fetchone()[0]
+
+def nova_identidade(conn): # Banco copiado de outra bancada: passa a ser uma réplica distinta
+    nova = uuid.uuid4().hex
+    with conn:
+        antiga = replica(conn)
+        conn.execute(f"UPDATE {CONTROL_TABLE} SET replica = ?, origem = ?", (nova, nova))
+        # O que já estava no banco veio da réplica original: as duas não trocam isso de novo
+        conn.execute(f"INSERT OR REPLACE INTO {PEERS_TABLE} (replica, ultimo_seq) VALUES (?, ?)",
+                     (antiga, ultimo_seq(conn)))
+    return nova
+
+# ---------------- EXPORTAÇÃO ----------------
+def _abrir(caminho, modo): # .gz comprimido, resto texto puro (JSON Lines)
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, modo + "t", encoding="utf-8")
+    return open(caminho, modo, encoding="utf-8")
+
+def mudancas(conn, desde=0, excluir_origem=None): # Mudanças com seq > desde, em ordem
+    # excluir_origem: não devolve ao destino o que nasceu nele (evita eco)
+    return conn.execute(f"SELECT seq, op, num_bosch, modelo_ecu, fabricante, antigo_num, antigo_modelo, momento, "
+                        f"origem FROM {LOG_TABLE} WHERE seq > ? AND origem IS NOT ? ORDER BY seq",
+                        (desde, excluir_origem))
+
+def exportar(conn, caminho, desde=0, excluir_origem=None): # Grava o delta; retorna quantas mudanças
+    ate = ultimo_seq(conn) # Lido antes: mudanças concorrentes ficam para o próximo delta
+    total = 0
+    with _abrir(caminho, "w") as f:
+        f.write(json.dumps({"formato": FORMATO, "replica": replica(conn), "desde": desde, "ate": ate}) + "\n")
+        for linha in mudancas(conn, desde, excluir_origem):
+            if linha[0] > ate:
+                break
+            f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+            total += 1
+    return total
+
+# ---------------- APLICAÇÃO ----------------
+class Relatorio: # Resultado de um delta aplicado
+    def __init__(self):
+        self.aplicadas = 0
+        self.ignoradas = 0 # Já estavam no banco (mesmo valor)
+        self.conflitos = 0 # Perderam para uma escrita local mais recente
+        self.segundos = 0.0
+
+    def __repr__(self):
+        return (f"Relatorio(aplicadas={self.aplicadas}, ignoradas={self.ignoradas}, "
+                f"conflitos={self.conflitos}, segundos={self.segundos:.3f})")
+
+def _linha(conn, num, modelo): # (id, num_bosch, modelo_ecu, fabricante) pela chave normalizada; exato primeiro
+    return conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante FROM {busca.TABLE_NAME} WHERE num_norm = ? "
+                        f"AND modelo_ecu = ? ORDER BY num_bosch = ? DESC, id LIMIT 1",
+                        (busca.normalize_num(num), modelo, num)).fetchone()
+
+def _versao_local(conn, ecu_id): # (momento, réplica) da última mudança da linha; linha antiga = (0, "")
+    return conn.execute(f"SELECT momento, origem FROM {LOG_TABLE} WHERE ecu_id = ? ORDER BY seq DESC LIMIT 1",
+                        (ecu_id,)).fetchone() or (0.0, "")
+
+def _exclusao_local(conn, *chaves): # (momento, réplica) do DELETE mais recente de alguma das chaves
+    versoes = [conn.execute(f"SELECT momento, origem FROM {LOG_TABLE} WHERE op = 'D' AND antigo_num = ? "
+                            f"AND antigo_modelo = ? ORDER BY seq DESC LIMIT 1", chave).fetchone()
+               for chave in chaves if chave[0] is not None]
+    return max((v for v in versoes if v), default=(0.0, ""))
+
+def _aplicar(conn, op, num, modelo, fabricante, antigo_num, antigo_modelo, versao, relatorio):
+    alvo = _linha(conn, antigo_num, antigo_modelo) if op in "UD" else None
+    if op == "D":
+        if alvo is None:
+            relatorio.ignoradas += 1
+        elif versao > _versao_local(conn, alvo[0]):
+            conn.execute(f"DELETE FROM {busca.TABLE_NAME} WHERE id = ?", (alvo[0],))
+            relatorio.aplicadas += 1
+        else:
+            relatorio.conflitos += 1
+        return
+    existente = _linha(conn, num, modelo)
+    if alvo is not None and existente is not None and existente[0] != alvo[0]: # Renomeada para uma chave ocupada
+        if versao > _versao_local(conn, existente[0]):
+            conn.execute(f"DELETE FROM {busca.TABLE_NAME} WHERE id = ?", (existente[0],))
+        else: # A linha local é mais nova: a renomeação se funde nela
+            conn.execute(f"DELETE FROM {busca.TABLE_NAME} WHERE id = ?", (alvo[0],))
+            relatorio.conflitos += 1
+            return
+    elif alvo is None: # INSERT (ou UPDATE de linha que não existe aqui): vira upsert na chave nova
+        alvo = existente
+    if alvo is None:
+        if versao < _exclusao_local(conn, (num, modelo), (antigo_num, antigo_modelo)): # Excluída aqui depois
+            relatorio.conflitos += 1
+            return
+        conn.execute(f"INSERT INTO {busca.TABLE_NAME} (num_bosch, modelo_ecu, fabricante, num_norm, familia) "
+                     f"VALUES (?, ?, ?, ?, ?)",
+                     (num, modelo, fabricante, busca.normalize_num(num), estatisticas.familia(modelo)))
+        relatorio.aplicadas += 1
+    elif alvo[1:] == (num, modelo, fabricante):
+        relatorio.ignoradas += 1
+    elif versao > _versao_local(conn, alvo[0]):
+        conn.execute(f"UPDATE {busca.TABLE_NAME} SET num_bosch = ?, modelo_ecu = ?, fabricante = ?, num_norm = ?, "
+                     f"familia = ? WHERE id = ?",
+                     (num, modelo, fabricante, busca.normalize_num(num), estatisticas.familia(modelo), alvo[0]))
+        relatorio.aplicadas += 1
+    else:
+        relatorio.conflitos += 1
+
+def aplicar(conn, caminho): # Aplica um delta numa única transação
+    relatorio = Relatorio()
+    inicio = time.perf_counter()
+    with _abrir(caminho, "r") as f:
+        cabecalho = json.loads(f.readline())
+        if cabecalho.get("formato") != FORMATO:
+            raise ValueError(f"Formato de delta desconhecido: {cabecalho.get('formato')}")
+        local = replica(conn)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for texto in f:
+                _, op, num, modelo, fabricante, antigo_num, antigo_modelo, momento, origem = json.loads(texto)
+                if origem == local: # Mudança que nasceu aqui e voltou por outra réplica
+                    relatorio.ignoradas += 1
+                    continue
+                # Os gatilhos registram a mudança com o momento e a réplica de origem (LWW nas próximas trocas)
+                conn.execute(f"UPDATE {CONTROL_TABLE} SET origem = ?, momento = ?", (origem, momento))
+                _aplicar(conn, op, num, modelo, fabricante, antigo_num, antigo_modelo, (momento, origem), relatorio)
+            conn.execute(f"UPDATE {CONTROL_TABLE} SET origem = replica, momento = NULL")
+            conn.execute(f"INSERT INTO {PEERS_TABLE} (replica, ultimo_seq) VALUES (?, ?) ON CONFLICT(replica) "
+                         f"DO UPDATE SET ultimo_seq = MAX(ultimo_seq, excluded.ultimo_seq)",
+                         (cabecalho["replica"], cabecalho["ate"]))
+            conn.commit()
+        except BaseException:
+            conn.rollback() # Delta pela metade não fica no banco
+            raise
+    busca.bump_generation()
+    relatorio.segundos = time.perf_counter() - inicio
+    return relatorio
+
+def recebido_de(conn, replica_origem): # Última sequência da origem já aplicada aqui
+    row = conn.execute(f"SELECT ultimo_seq FROM {PEERS_TABLE} WHERE replica = ?", (replica_origem,)).fetchone()
+    return row[0] if row else 0
+
+def enviar(origem, destino, caminho): # origem -> destino, só o que o destino ainda não recebeu
+    desde = recebido_de(destino, replica(origem))
+    exportar(origem, caminho, desde, excluir_origem=replica(destino))
+    return aplicar(destino, caminho)
+
+# ---------------- MAIN ----------------
+def conectar(caminho, rede=None): # Conexão com schema completo (tabela, FTS, gatilhos) de um banco qualquer
+    # rede: banco em compartilhamento de rede, aberto sem WAL (None = detecta pelo caminho, ver db.is_network_path)
+    import main # Schema do catálogo (main importa este módulo; import tardio evita o ciclo)
+    if rede is None:
+        rede = db.is_network_path(caminho)
+    return db.get_connection(caminho, main._create_schema, wal=not rede)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sincronização incremental entre cópias do ecus.db.")
+    parser.add_argument("--rede", action="store_true", default=None,
+                        help="Abre os bancos sem WAL (compartilhamento de rede montado como pasta local)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("exportar", help="Grava as mudanças depois de --desde")
+    p.add_argument("banco"); p.add_argument("delta")
+    p.add_argument("--desde", type=int, default=0, help="Última sequência que o destino já tem")
+    p = sub.add_parser("aplicar", help="Aplica um delta (uma transação)")
+    p.add_argument("delta"); p.add_argument("banco")
+    p = sub.add_parser("sincronizar", help="Troca as mudanças pendentes nos dois sentidos")
+    p.add_argument("banco_a"); p.add_argument("banco_b")
+    p.add_argument("--delta", help="Guarda o último delta neste arquivo (padrão: temporário)")
+    p = sub.add_parser("nova-identidade", help="Separa um banco copiado da réplica original")
+    p.add_argument("banco")
+    args = parser.parse_args(argv)
+    try:
+        if args.comando == "exportar":
+            total = exportar(conectar(args.banco, args.rede), args.delta, args.desde)
+            print(f"📤 {total} mudanças em {args.delta}")
+        elif args.comando == "aplicar":
+            print(f"📥 {aplicar(conectar(args.banco, args.rede), args.delta)!r}")
+        elif args.comando == "sincronizar":
+            a, b = conectar(args.banco_a, args.rede), conectar(args.banco_b, args.rede)
+            fd, caminho = tempfile.mkstemp(suffix=".jsonl.gz") if not args.delta else (None, args.delta)
+            if fd is not None:
+                os.close(fd)
+            try:
+                print(f"📥 {args.banco_a} -> {args.banco_b}: {enviar(a, b, caminho)!r}")
+                print(f"📥 {args.banco_b} -> {args.banco_a}: {enviar(b, a, caminho)!r}")
+            finally:
+                if fd is not None:
+                    os.remove(caminho)
+        else:
+            print(f"🆔 {args.banco}: {nova_identidade(conectar(args.banco, args.rede))}")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
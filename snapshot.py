@@ -0,0 +1,376 @@
+"""
+Snapshot binário do catálogo, somente leitura e mapeado em memória (mmap)
+Chaves normalizadas (num_norm) em largura fixa e ordenadas (prefixo por busca binária); modelo e fabricante
+codificados por dicionário (cada texto distinto aparece uma vez no arquivo). O main.py usa o snapshot
+para o catálogo inteiro e prefixos do número enquanto ele estiver em dia com o banco; curingas e
+substrings (modelo/fabricante) vão ao SQLite, que tem índices para eles.
+
+Arquivo <banco>.snap (little-endian, seções alinhadas em 8 bytes):
+    cabeçalho | chaves (n x largura_norm) | nums (n x largura) | ids (n x int64) | modelo (n x uint32) | fabricante (n x uint32)
+    | por_id (n x uint32: posições em ordem de id) | dicionário de modelos | dicionário de fabricantes
+"""
+
+import os, mmap, struct, bisect, heapq, threading, glob, time
+from collections import OrderedDict
+from array import array
+
+import db, busca
+
+MAGIC = b"ECUSNAP2" # Arquivos de outra versão do formato são descartados e gerados de novo
+CABECALHO = struct.Struct("<8sQQQIIII") # magic, n, versao, max_id, largura, largura_norm, n_modelos, n_fabricantes
+VERSION_TABLE = busca.VERSION_TABLE # Contador persistente de mudanças (gatilhos)
+NULO = 0xFFFFFFFF # Índice de dicionário para fabricante NULL
+TEMPORARIO_ANTIGO_S = 600 # Temporários mais velhos que isso não estão sendo gravados: podem ser apagados
+RECONSTRUCAO_INTERVALO_S = 30 # Mínimo entre duas reconstruções (edições seguidas geram uma só)
+LOTE_LINHAS = 10_000 # Linhas decodificadas entre dois pontos de cancelamento
+FILTROS_EM_CACHE = 8 # Filtros recentes cujas posições ficam guardadas (count + páginas seguintes)
+
+# ---------------- VERSÃO DOS DADOS ----------------
+def create_schema(conn): # Contador incrementado a cada INSERT/UPDATE/DELETE (persiste entre processos)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (versao INTEGER NOT NULL)")
+    if not conn.execute(f"SELECT 1 FROM {VERSION_TABLE}").fetchone():
+        conn.execute(f"INSERT INTO {VERSION_TABLE} (versao) VALUES (0)")
+    # Importações em massa suspendem o gatilho de INSERT (mesma flag do FTS) e contam uma vez só
+    em_lote = f"WHEN (SELECT bulk FROM {busca.FTS_CONTROL}) = 0 " if busca.fts_enabled else ""
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {VERSION_TABLE}_{evento.lower()} AFTER {evento} ON {busca.TABLE_NAME}
+            {em_lote if evento == "INSERT" else ""}BEGIN
+                UPDATE {VERSION_TABLE} SET versao = versao + 1;
+            END
+        """)
+
+def data_version(conn): # Versão atual dos dados
+    return conn.execute(f"SELECT versao FROM {VERSION_TABLE}").fetchone()[0]
+
+def bump_version(conn): # Uma mudança (fim de importação em massa), dentro da transação aberta
+    conn.execute(f"UPDATE {VERSION_TABLE} SET versao = versao + 1")
+
+# ---------------- ESCRITA ----------------
+def _alinhar(f): # Completa com zeros até múltiplo de 8
+    f.write(b"\0" * (-f.tell() % 8))
+
+def _escrever_dicionario(f, textos): # offsets (uint32, n+1) + bytes UTF-8
+    dados = [t.encode("utf-8") for t in textos]
+    offsets = array("I", [0])
+    for d in dados:
+        offsets.append(offsets[-1] + len(d))
+    f.write(offsets.tobytes())
+    _alinhar(f)
+    f.write(b"".join(dados))
+    _alinhar(f)
+
+def _escrever(caminho, registros, modelos, fabricantes, versao, max_id):
+    # registros: [(num_norm, num_bosch (bytes), id, índice do modelo, índice do fabricante)] ordenados
+    largura_norm = max((len(r[0]) for r in registros), default=1)
+    largura = max((len(r[1]) for r in registros), default=1)
+    ids = array("q", (r[2] for r in registros))
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(CABECALHO.pack(MAGIC, len(registros), versao, max_id, largura, largura_norm,
+                               len(modelos), len(fabricantes)))
+        secoes = (
+            b"".join(r[0].ljust(largura_norm, b"\0") for r in registros),
+            b"".join(r[1].ljust(largura, b"\0") for r in registros),
+            ids.tobytes(),
+            array("I", (r[3] for r in registros)).tobytes(),
+            array("I", (r[4] for r in registros)).tobytes(),
+            array("I", sorted(range(len(ids)), key=ids.__getitem__)).tobytes(),
+        )
+        for secao in secoes:
+            f.write(secao)
+            _alinhar(f)
+        _escrever_dicionario(f, modelos)
+        _escrever_dicionario(f, fabricantes)
+    return temporario
+
+class _Dicionario: # texto -> índice, preservando os índices já gravados
+    def __init__(self, textos=()):
+        self.textos = list(textos)
+        self.indices = {t: i for i, t in enumerate(self.textos)}
+
+    def indice(self, texto):
+        if texto is None:
+            return NULO
+        i = self.indices.get(texto)
+        if i is None:
+            i = self.indices[texto] = len(self.textos)
+            self.textos.append(texto)
+        return i
+
+def _codificar(linhas, modelos, fabricantes): # Linhas do SQLite -> registros ordenados por (num_norm, num, id)
+    return sorted(((norm if norm is not None else busca.normalize_num(num)).encode("utf-8"), num.encode("utf-8"),
+                   row_id, modelos.indice(modelo or ""), fabricantes.indice(fabricante))
+                  for row_id, num, modelo, fabricante, norm in linhas)
+
+def _ler_novas(conn, depois_de): # (versão, max_id, linhas com id > depois_de) numa leitura consistente
+    conn.execute("BEGIN")
+    try:
+        versao = data_version(conn)
+        linhas = conn.execute(f"SELECT id, num_bosch, modelo_ecu, fabricante, num_norm FROM {busca.TABLE_NAME} "
+                              f"WHERE id > ?", (depois_de,)).fetchall()
+        max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {busca.TABLE_NAME}").fetchone()[0]
+    finally:
+        conn.execute("COMMIT")
+    return versao, max_id, linhas
+
+def construir(conn, caminho): # Snapshot completo a partir do banco; retorna o arquivo temporário gravado
+    versao, max_id, linhas = _ler_novas(conn, 0)
+    modelos, fabricantes = _Dicionario(), _Dicionario()
+    registros = _codificar(linhas, modelos, fabricantes)
+    return _escrever(caminho, registros, modelos.textos, fabricantes.textos, versao, max_id)
+
+def acrescentar(snap, conn, caminho, versao_esperada): # Incremental: snapshot atual + linhas com id > snap.max_id
+    # Só vale quando as únicas mudanças desde snap.versao foram inserções (caso da importação em massa).
+    # Retorna None se o banco já está em outra versão (outra gravação entrou no meio).
+    versao, max_id, linhas = _ler_novas(conn, snap.max_id)
+    if versao != versao_esperada:
+        return None
+    modelos, fabricantes = _Dicionario(snap.modelos), _Dicionario(snap.fabricantes)
+    novos = _codificar(linhas, modelos, fabricantes)
+    antigos = ((snap.norm_bytes(p), snap.num_bytes(p), snap.ids[p], snap.modelo_idx[p], snap.fabricante_idx[p])
+               for p in range(snap.n))
+    registros = list(heapq.merge(antigos, novos)) # As duas sequências já estão ordenadas
+    return _escrever(caminho, registros, modelos.textos, fabricantes.textos, versao, max_id)
+
+# ---------------- LEITURA ----------------
+class _Numeros: # Sequência de textos em largura fixa (bytes), indexável pelo bisect
+    def __init__(self, dados, largura, n):
+        self.dados, self.largura, self.n = dados, largura, n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return bytes(self.dados[i * self.largura:(i + 1) * self.largura])
+
+class Snapshot:
+    def __init__(self, caminho):
+        with open(caminho, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mv = self._mv = memoryview(self._mm)
+        magic, self.n, self.versao, self.max_id, largura, largura_norm, n_modelos, n_fabricantes = \
+            CABECALHO.unpack_from(mv)
+        if magic != MAGIC:
+            self.fechar()
+            raise ValueError(f"{caminho}: não é um snapshot de ECUs")
+        pos = CABECALHO.size
+
+        def secao(tamanho, formato=None):
+            nonlocal pos
+            parte = mv[pos:pos + tamanho]
+            pos += tamanho + (-tamanho % 8)
+            return parte.cast(formato) if formato else parte
+
+        self.normas = _Numeros(secao(self.n * largura_norm), largura_norm, self.n)
+        self.nums = _Numeros(secao(self.n * largura), largura, self.n)
+        self.ids = secao(self.n * 8, "q")
+        self.modelo_idx = secao(self.n * 4, "I")
+        self.fabricante_idx = secao(self.n * 4, "I")
+        self.por_id = secao(self.n * 4, "I")
+        self.modelos = self._dicionario(secao, n_modelos)
+        self.fabricantes = self._dicionario(secao, n_fabricantes)
+        self._filtros = OrderedDict() # num -> posições em ordem de id
+        self._filtros_lock = threading.Lock() # Consultas de várias threads dividem o cache
+        self.usos = 0 # Consultas em andamento (protegido por _lock do módulo)
+        self.aposentado = False # Substituído: fecha quando a última consulta terminar
+
+    @staticmethod
+    def _dicionario(secao, quantidade): # Textos distintos (poucos: vão para listas Python)
+        offsets = secao((quantidade + 1) * 4, "I")
+        dados = bytes(secao(offsets[-1]))
+        textos = [dados[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(quantidade)]
+        offsets.release()
+        return textos
+
+    def fechar(self): # Libera o mapeamento (nenhuma consulta pode estar em andamento)
+        self._filtros = OrderedDict() # Pode conter fatias de por_id
+        for nome in ("por_id", "fabricante_idx", "modelo_idx", "ids"):
+            if hasattr(self, nome):
+                getattr(self, nome).release()
+        for nome in ("nums", "normas"):
+            if hasattr(self, nome):
+                getattr(self, nome).dados.release()
+        self._mv.release()
+        self._mm.close()
+
+    def num_bytes(self, pos):
+        return self.nums[pos].rstrip(b"\0")
+
+    def norm_bytes(self, pos):
+        return self.normas[pos].rstrip(b"\0")
+
+    def linha(self, pos): # (id, num_bosch, modelo_ecu, fabricante)
+        fabricante = self.fabricante_idx[pos]
+        return (self.ids[pos], self.num_bytes(pos).decode("utf-8"), self.modelos[self.modelo_idx[pos]],
+                None if fabricante == NULO else self.fabricantes[fabricante])
+
+    @staticmethod
+    def atende(num_bosch="", modelo="", fabricante=""): # O filtro é resolvido por faixa no snapshot?
+        # Curinga, número só de zeros/pontuação e substrings exigiriam varrer as linhas em Python: SQLite
+        if modelo or fabricante:
+            return False
+        return not num_bosch or (not any(w in num_bosch for w in busca.WILDCARDS) and bool(busca.normalize_num(num_bosch)))
+
+    def _posicoes(self, num_bosch, verificar=None): # Posições do prefixo em ordem de id (com cache)
+        with self._filtros_lock:
+            posicoes = self._filtros.get(num_bosch)
+            if posicoes is not None:
+                self._filtros.move_to_end(num_bosch)
+                return posicoes
+        posicoes = self._filtrar(num_bosch, verificar) # Fora do lock: outra thread pode consultar ao mesmo tempo
+        with self._filtros_lock:
+            self._filtros[num_bosch] = posicoes
+            if len(self._filtros) > FILTROS_EM_CACHE:
+                self._filtros.popitem(last=False)
+        return posicoes
+
+    def _filtrar(self, num_bosch, verificar=None): # verificar(): ponto de cancelamento da tarefa (ou None)
+        if not num_bosch:
+            return self.por_id
+        norm = busca.normalize_num(num_bosch) # Prefixo da chave normalizada: faixa contínua no array ordenado
+        inicio = bisect.bisect_left(self.normas, norm.encode("utf-8"))
+        fim = bisect.bisect_left(self.normas, busca._prefix_upper(norm).encode("utf-8"))
+        if verificar:
+            verificar()
+        return sorted(range(inicio, fim), key=self.ids.__getitem__)
+
+    def _linhas(self, posicoes, verificar=None):
+        linhas = []
+        for inicio in range(0, len(posicoes), LOTE_LINHAS):
+            if verificar:
+                verificar()
+            linhas += [self.linha(p) for p in posicoes[inicio:inicio + LOTE_LINHAS]]
+        return linhas
+
+    # Mesmo contrato de busca.search/count/page, só para filtros em que atende() é verdadeiro
+    def search(self, num_bosch="", modelo="", fabricante="", verificar=None):
+        return self._linhas(self._posicoes(num_bosch, verificar), verificar)
+
+    def count(self, num_bosch="", modelo="", fabricante="", verificar=None):
+        return len(self._posicoes(num_bosch, verificar))
+
+    def page(self, num_bosch="", modelo="", fabricante="", after_id=0, limit=200, before_id=None, verificar=None):
+        posicoes = self._posicoes(num_bosch, verificar)
+        if before_id is not None:
+            fim = bisect.bisect_left(posicoes, before_id, key=self.ids.__getitem__)
+            inicio = max(fim - limit, 0)
+        else:
+            inicio = bisect.bisect_right(posicoes, after_id, key=self.ids.__getitem__)
+            fim = inicio + limit
+        return [self.linha(p) for p in posicoes[inicio:fim]]
+
+# ---------------- SNAPSHOT ATUAL ----------------
+_lock = threading.Lock() # Protege _atuais/_construindo e os contadores de uso (não a consulta em si)
+_atuais = {} # caminho do banco -> Snapshot carregado
+_construindo = set() # Bancos com reconstrução em segundo plano em andamento (ou agendada)
+_ultima_reconstrucao = {} # caminho do banco -> time.monotonic() do início da última reconstrução
+
+def arquivo(caminho_db):
+    return caminho_db + ".snap"
+
+def _limpar_temporarios(destino): # Apaga temporários de instalações que caíram no fallback (ou de processos mortos)
+    limite = time.time() - TEMPORARIO_ANTIGO_S
+    for caminho in glob.glob(glob.escape(destino) + ".*.tmp"):
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError: # Ainda mapeado por outro processo (Windows) ou já apagado: fica para a próxima
+            pass
+
+def _soltar(snap): # Com _lock: fecha agora ou quando a última consulta em andamento terminar
+    snap.aposentado = True
+    if not snap.usos:
+        snap.fechar()
+
+def _instalar(caminho_db, temporario): # Troca o snapshot em uso pelo arquivo recém-gravado
+    destino = arquivo(caminho_db)
+    with _lock:
+        antigo = _atuais.pop(caminho_db, None)
+        if antigo:
+            _soltar(antigo) # No Windows um arquivo mapeado não pode ser substituído (em uso: cai no temporário)
+        try:
+            os.replace(temporario, destino)
+        except OSError: # Outro processo ainda mapeia o arquivo: usa o temporário
+            destino = temporario
+        else: # O arquivo definitivo está em uso: sobras de fallbacks anteriores não servem mais
+            _limpar_temporarios(destino)
+        _atuais[caminho_db] = Snapshot(destino)
+
+def _reconstruir(caminho_db, espera=0.0): # Thread de fundo: snapshot completo
+    time.sleep(espera) # Escritas durante a espera entram na mesma reconstrução
+    with _lock:
+        _ultima_reconstrucao[caminho_db] = time.monotonic()
+    try:
+        _instalar(caminho_db, construir(db.get_connection(caminho_db), arquivo(caminho_db)))
+    except Exception as e:
+        print("❌ Erro ao gerar o snapshot:", e)
+    finally:
+        db.close_thread_connections()
+        with _lock:
+            _construindo.discard(caminho_db)
+
+def _agendar(caminho_db): # Dispara (uma vez) a reconstrução em segundo plano; chamar com _lock
+    # No máximo uma a cada RECONSTRUCAO_INTERVALO_S: enquanto isso as buscas vão ao SQLite
+    if caminho_db not in _construindo:
+        _construindo.add(caminho_db)
+        ultima = _ultima_reconstrucao.get(caminho_db)
+        espera = 0.0 if ultima is None else max(ultima + RECONSTRUCAO_INTERVALO_S - time.monotonic(), 0.0)
+        threading.Thread(target=_reconstruir, args=(caminho_db, espera), daemon=True, name="ecu-snapshot").start()
+
+def gerar(caminho_db, conn): # Gera e instala o snapshot agora, na thread atual (benchmark)
+    _instalar(caminho_db, construir(conn, arquivo(caminho_db)))
+
+def esquecer_filtros(caminho_db): # Descarta as posições guardadas por filtro (a próxima busca filtra de novo)
+    with _lock:
+        snap = _atuais.get(caminho_db)
+        if snap:
+            snap._filtros.clear()
+
+def fechar(caminho_db): # Libera o snapshot carregado do banco (o arquivo continua no disco)
+    with _lock:
+        snap = _atuais.pop(caminho_db, None)
+        if snap:
+            _soltar(snap)
+
+def consultar(caminho_db, conn, metodo, *args, verificar=None, **kwargs): # Resposta pelo snapshot; None = usar o SQLite
+    if not Snapshot.atende(*args[:3]):
+        return None
+    versao = data_version(conn)
+    with _lock:
+        snap = _atuais.get(caminho_db)
+        if snap is None and caminho_db not in _construindo and os.path.exists(arquivo(caminho_db)):
+            try: # 1ª consulta do processo: só mapeia o arquivo (carga instantânea)
+                snap = _atuais[caminho_db] = Snapshot(arquivo(caminho_db))
+            except (OSError, ValueError, struct.error):
+                snap = None
+        if snap is None or snap.versao != versao: # Ausente ou desatualizado: SQLite agora, snapshot novo em breve
+            _agendar(caminho_db)
+            return None
+        snap.usos += 1 # A troca de arquivo espera esta consulta para fechar o mapeamento
+    try:
+        return getattr(snap, metodo)(*args, verificar=verificar, **kwargs)
+    finally:
+        with _lock:
+            snap.usos -= 1
+            if snap.aposentado and not snap.usos:
+                snap.fechar()
+
+def apos_importacao(caminho_db, conn, versao_antes, versao_depois): # Atualiza o snapshot após importação em massa
+    with _lock:
+        snap = _atuais.get(caminho_db)
+        incremental = snap is not None and snap.versao == versao_antes and caminho_db not in _construindo
+        if not incremental:
+            _agendar(caminho_db)
+            return
+        _construindo.add(caminho_db)
+    temporario = None
+    try:
+        temporario = acrescentar(snap, conn, arquivo(caminho_db), versao_depois)
+        if temporario:
+            _instalar(caminho_db, temporario)
+    finally:
+        with _lock:
+            _construindo.discard(caminho_db)
+            if not temporario:
+                _agendar(caminho_db)
@@ -0,0 +1,156 @@
+"""
+Executor de tarefas em segundo plano (ECU Manager)
+Banco e arquivos rodam fora da thread do Tk; os resultados voltam por uma fila lida com root.after.
+"""
+
+import threading, queue, time
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_MS = 50 # Intervalo de leitura da fila de resultados na thread do Tk
+PROGRESS_INTERVAL = 0.1 # Segundos mínimos entre dois avisos de progresso
+SHORT_WORKERS = 2 # Consultas curtas (grid, busca) em paralelo com a tarefa longa
+BAR_WIDTH = 20 # Caracteres da barra de progresso no status
+
+_local = threading.local() # Tarefa em execução na thread de trabalho atual
+
+def current(): # Task que a thread atual está executando (None fora do TaskRunner)
+    return getattr(_local, "task", None)
+
+class TaskCancelled(Exception): # Levantada dentro da tarefa quando o usuário cancela
+    pass
+
+class Task: # Uma unidade de trabalho; a função recebe a Task como 1º argumento
+    def __init__(self, name, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self.name = name
+        self.on_done, self.on_error = on_done, on_error
+        self.on_progress, self.on_cancel = on_progress, on_cancel
+        self.started = None # perf_counter do início (None enquanto está na fila)
+        self.done = 0 # Linhas processadas até agora
+        self._cancel = threading.Event()
+        self._last_progress = 0.0
+        self._post = None # Preenchido pelo TaskRunner
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self): # Pode ser chamado de qualquer thread
+        self._cancel.set()
+
+    def check(self): # Ponto de cancelamento: chamar entre lotes
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name)
+
+    def watch(self, conn): # Interrompe a consulta SQLite em andamento se a tarefa for cancelada
+        conn.set_progress_handler(self._cancel.is_set, 1000)
+
+    def unwatch(self, conn):
+        conn.set_progress_handler(None, 0)
+
+    def progress(self, done, fraction=None): # Informa o avanço (limitado a ~10 avisos/s)
+        self.done = done
+        now = time.perf_counter()
+        if self.on_progress is None or now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        rate = done / (now - self.started) if self.started and now > self.started else 0.0
+        self._post(self.on_progress, self, done, fraction, rate)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started if self.started else 0.0
+
+class TaskRunner: # Uma tarefa longa por vez (as demais esperam na fila) + consultas curtas
+    def __init__(self, root, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._results = queue.Queue() # Callbacks a executar na thread do Tk
+        self._long = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ecu-longa")
+        self._short = ThreadPoolExecutor(max_workers=SHORT_WORKERS, thread_name_prefix="ecu-curta")
+        self._queued = [] # Tarefas longas ainda não concluídas (a primeira é a que está rodando)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, name, fn, *args, long=False, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        task = Task(name, on_done, on_error, on_progress, on_cancel)
+        task._post = self._post
+        if long:
+            with self._lock:
+                self._queued.append(task)
+        (self._long if long else self._short).submit(self._run, task, fn, args, long)
+        return task
+
+    @property
+    def current(self): # Tarefa longa em execução (ou None)
+        with self._lock:
+            return self._queued[0] if self._queued else None
+
+    @property
+    def waiting(self): # Quantas tarefas longas aguardam na fila
+        with self._lock:
+            return max(len(self._queued) - 1, 0)
+
+    def cancel_current(self):
+        task = self.current
+        if task:
+            task.cancel()
+        return task
+
+    def _post(self, callback, *args): # Agenda um callback na thread do Tk
+        if callback is not None:
+            self._results.put((callback, args))
+
+    def _run(self, task, fn, args, long): # Roda na thread de trabalho
+        _local.task = task
+        try:
+            task.check()
+            task.started = time.perf_counter()
+            result = fn(task, *args)
+        except TaskCancelled:
+            self._post(task.on_cancel, task)
+        except Exception as e:
+            if task.cancelled: # sqlite3 "interrupted" após task.watch
+                self._post(task.on_cancel, task)
+            else:
+                self._post(task.on_error, task, e)
+        else:
+            self._post(task.on_done, task, result)
+        finally:
+            _local.task = None
+            if long:
+                with self._lock:
+                    self._queued.remove(task)
+
+    def _poll(self): # Executa os callbacks pendentes (thread do Tk)
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e: # Um callback com erro não pode parar a fila
+                print("❌ Erro no callback da tarefa:", e)
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def shutdown(self): # Cancela tudo (ao sair)
+        self._closed = True
+        with self._lock:
+            for task in self._queued:
+                task.cancel()
+        self._long.shutdown(wait=False, cancel_futures=True)
+        self._short.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.root.after_cancel(self._after_id)
+        except Exception: # Janela já destruída
+            pass
+
+def format_progress(task, done, fraction, rate, waiting=0): # Texto da barra de progresso para o status
+    queued = f" · +{waiting} na fila" if waiting else ""
+    if fraction is None:
+        return f"{task.name}: {done:,} linhas · {rate:,.0f} linhas/s{queued}".replace(",", ".")
+    filled = int(BAR_WIDTH * min(max(fraction, 0.0), 1.0))
+    bar = "█" * filled + "░" * (BAR_WIDTH - filled)
+    return f"{task.name} [{bar}] {fraction:.0%} · {done:,} linhas · {rate:,.0f} linhas/s{queued}".replace(",", ".")